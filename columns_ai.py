@@ -0,0 +1,142 @@
+import collections
+import time
+
+import columns_mechanics
+
+class _OutOfTime(Exception):
+    '''Raised inside the search when the time budget or the node budget for a move runs out'''
+    pass
+
+class PlacementPlanner():
+    '''
+    Picks where to put a faller by trying every (column, rotation) it can reach, simulating the result,
+    and looking ahead at the next pieces if they are known
+    Boards that were already scored are kept in a bounded table keyed by the board's zobrist hash
+    The search for each move stops after time_budget seconds, or after node_budget placements have been tried;
+    either can be None, and with no time budget the same game always gets the same plan
+    '''
+    def __init__(self, depth: int = 3, time_budget: float = 0.05, table_size: int = 100000, node_budget: int = None):
+        self._depth = depth
+        self._time_budget = time_budget
+        self._node_budget = node_budget
+        self._table_size = table_size
+        self._table = collections.OrderedDict()
+        self._deadline = None
+        self._nodes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def plan(self, game: columns_mechanics.ColumnsGame, upcoming: list[tuple] = ()) -> tuple:
+        '''
+        Returns the best (column, rotations) for the faller that is falling in the game, or None if there is no faller
+        upcoming is the (top, middle, bottom) jewels of the pieces after this one, used for looking ahead
+        Searches one piece deeper at a time until the depth, the time budget or the node budget is reached
+        '''
+        placements = self.placements(game)
+        if placements == []:
+            return None
+        self._deadline = None if self._time_budget == None else time.perf_counter() + self._time_budget
+        self._nodes = 0
+
+        best = placements[0]
+        for depth in range(1, min(self._depth, len(upcoming)+1)+1):
+            try:
+                best_score = None
+                for placement in placements:
+                    after, gained = self._place(game, placement)
+                    score = gained + self._value(after, upcoming, depth-1)
+                    if best_score == None or score > best_score:
+                        best_score, best_placement = score, placement
+            except _OutOfTime:
+                break
+            best = best_placement
+        return best
+
+    def placements(self, game: columns_mechanics.ColumnsGame) -> list[tuple]:
+        '''Returns every (column, rotations) the falling faller can reach by moving left and right from where it is'''
+        if game.get_faller_status() != 'falling' and game.get_faller_status() != 'landed':
+            return []
+        columns = [game.get_bot_coords()[1]]
+        for move in ('move_faller_left', 'move_faller_right'):
+            trial = game.clone()
+            last = trial.get_bot_coords()[1]
+            while True:
+                getattr(trial, move)()
+                if trial.get_bot_coords()[1] == last:
+                    break
+                last = trial.get_bot_coords()[1]
+                columns.append(last)
+        return [(col, rotations) for col in sorted(columns) for rotations in range(3)]
+
+    def _place(self, game: columns_mechanics.ColumnsGame, placement: tuple) -> tuple:
+        '''Returns a copy of the game with the falling faller rotated, moved and dropped into place, and the score gained'''
+        self._check_time()
+        col, rotations = placement
+        after = game.clone()
+        for i in range(rotations):
+            after.rotate_faller()
+        while after.get_bot_coords()[1] < col:
+            after.move_faller_right()
+        while after.get_bot_coords()[1] > col:
+            after.move_faller_left()
+        return after, self._settle(after)
+
+    def _value(self, game: columns_mechanics.ColumnsGame, upcoming: list[tuple], depth: int) -> float:
+        '''Returns how good a settled board is, trying each open column and rotation for the next pieces'''
+        if game.check_for_game_over() == True:
+            return -1000000.0
+        if depth == 0:
+            return self._evaluate(game)
+
+        key = (game.get_hash(), tuple(upcoming[:depth]))
+        if key in self._table:
+            self.hits += 1
+            self._table.move_to_end(key)
+            return self._table[key]
+        self.misses += 1
+
+        top, mid, bot = upcoming[0]
+        best = None
+        for col in game.get_open_columns():
+            for jewels in ((top, mid, bot), (bot, top, mid), (mid, bot, top)):
+                self._check_time()
+                after = game.clone()
+                after.create_faller(f'F {col+1} {jewels[0]} {jewels[1]} {jewels[2]}')
+                score = self._settle(after) + self._value(after, upcoming[1:], depth-1)
+                if best == None or score > best:
+                    best = score
+        if best == None:
+            best = -1000000.0
+
+        self._table[key] = best
+        if len(self._table) > self._table_size:
+            self._table.popitem(last=False)
+        return best
+
+    def _settle(self, game: columns_mechanics.ColumnsGame) -> float:
+        '''Ticks the game until the faller is gone, pops every chain it set off and returns the score the game gave for them'''
+        before = game.get_score()
+        while game.get_faller_status() != None:
+            game.tick()
+        game.resolve_chains()
+        return float(game.get_score() - before)
+
+    def _evaluate(self, game: columns_mechanics.ColumnsGame) -> float:
+        '''Scores a settled board by how tall its stacks are, with the tallest stack counting extra'''
+        board = game.get_board()
+        heights = []
+        for col in range(len(board[0])):
+            row = 0
+            while row < len(board) and board[row][col] == ' ':
+                row += 1
+            heights.append(len(board)-row)
+        return -float(sum(heights)) - 3.0*max(heights)
+
+    def _check_time(self) -> None:
+        '''Counts one more placement tried, and stops the search if either budget has run out'''
+        self._nodes += 1
+        if self._node_budget != None and self._nodes > self._node_budget:
+            raise _OutOfTime
+        if self._deadline != None and time.perf_counter() > self._deadline:
+            raise _OutOfTime
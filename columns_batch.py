@@ -0,0 +1,196 @@
+import numpy
+
+from columns_mechanics import InvalidMoveError
+
+_EMPTY = ord(' ')
+
+#faller status codes, one per game
+_NONE = 0
+_FALLING = 1
+_LANDED = 2
+_FROZEN = 3
+
+_STATUS_NAMES = {_NONE: None, _FALLING: 'falling', _LANDED: 'landed', _FROZEN: 'frozen'}
+
+class BatchColumnsGame():
+    '''
+    Holds n separate games as one (n, r+3, c) array of jewel codes and steps all of them at once
+    Each game follows the same rules as columns_mechanics.ColumnsGame, and the faller of every game
+    is kept in arrays so a tick is a handful of array operations no matter how many games there are
+    '''
+    def __init__(self, n: int, r: int, c: int):
+        if c < 3 or r < 4:
+            raise ValueError
+        self._n = n
+        self._r = r
+        self._c = c
+
+        self._board = numpy.full((n, r+3, c), _EMPTY, dtype=numpy.uint8)
+
+        self._faller_x = numpy.zeros(n, dtype=numpy.intp)
+        self._bot_y = numpy.zeros(n, dtype=numpy.intp)
+        #top, middle and bottom jewel of each faller
+        self._jewels = numpy.full((n, 3), _EMPTY, dtype=numpy.uint8)
+        self._status = numpy.full(n, _NONE, dtype=numpy.int8)
+        self._game_over = numpy.zeros(n, dtype=bool)
+
+        #how many jewels each game popped, and how many rounds of popping there were
+        self._popped = numpy.zeros(n, dtype=numpy.int64)
+        self._pop_rounds = numpy.zeros(n, dtype=numpy.int64)
+
+    def get_board(self, game: int) -> list[list[str]]:
+        '''Returns the board of one game as a list of list of strings, the same way ColumnsGame stores it'''
+        return [list(bytes(row).decode('ascii')) for row in self._board[game]]
+
+    def get_faller_status(self, game: int) -> str:
+        '''Returns whether the faller of one game is falling, landed, or frozen'''
+        return _STATUS_NAMES[int(self._status[game])]
+
+    def get_game_over(self) -> numpy.ndarray:
+        '''Returns which games are over'''
+        return self._game_over.copy()
+
+    def get_stats(self) -> dict:
+        '''Returns how many jewels each game popped and how many rounds of popping each game had'''
+        return {'popped': self._popped.copy(), 'pop_rounds': self._pop_rounds.copy()}
+
+    def needs_faller(self) -> numpy.ndarray:
+        '''Returns which games have no faller, nothing left to pop and no jewels in the hidden rows'''
+        return (self._status == _NONE) & ~self._game_over & ~self._matches().any(axis=(1, 2)) \
+            & ~(self._board[:, :3] != _EMPTY).any(axis=(1, 2))
+
+    def create_fallers(self, games: numpy.ndarray, cols: numpy.ndarray, jewels: numpy.ndarray) -> None:
+        '''
+        Creates a faller in each of the given games, in the given column (starting from 0)
+        jewels holds the top, middle and bottom jewel codes for each faller
+        Like ColumnsGame.create_faller, the new faller moves down once right away
+        '''
+        games = numpy.asarray(games, dtype=numpy.intp)
+        cols = numpy.asarray(cols, dtype=numpy.intp)
+        if ((cols < 0) | (cols >= self._c)).any():
+            raise InvalidMoveError
+        jewels = numpy.broadcast_to(numpy.asarray(jewels, dtype=numpy.uint8), (len(games), 3))
+        ready = ((self._status[games] == _NONE) | (self._status[games] == _FROZEN)) & ~self._game_over[games]
+        games, cols, jewels = games[ready], cols[ready], jewels[ready]
+        self._faller_x[games] = cols
+        self._bot_y[games] = 2
+        self._jewels[games] = jewels
+        self._status[games] = _FALLING
+        for row in range(3):
+            self._board[games, row, cols] = self._jewels[games, row]
+        self._faller_down(games)
+
+    def create_random_fallers(self, rng: numpy.random.Generator, colors: str = 'STWXYZ') -> None:
+        '''Creates a faller with random jewels in a random open column of every game that needs one'''
+        games = self.needs_faller().nonzero()[0]
+        if len(games) == 0:
+            return
+        open_cols = self._board[games, 3, :] == _EMPTY
+        #if every column is full, any column will do and the game ends once the faller lands
+        open_cols[~open_cols.any(axis=1)] = True
+        cols = (rng.random(open_cols.shape) * open_cols).argmax(axis=1)
+        codes = numpy.frombuffer(colors.encode('ascii'), dtype=numpy.uint8)
+        jewels = codes[rng.integers(len(codes), size=(len(games), 3))]
+        self.create_fallers(games, cols, jewels)
+
+    def move_fallers(self, games: numpy.ndarray, step: int) -> None:
+        '''Moves the faller of each given game one column right (step 1) or left (step -1) if there is room'''
+        games = numpy.asarray(games, dtype=numpy.intp)
+        games = games[(self._status[games] == _FALLING) | (self._status[games] == _LANDED)]
+        new_x = self._faller_x[games] + step
+        inside = (new_x >= 0) & (new_x < self._c)
+        games, new_x = games[inside], new_x[inside]
+        games = games[self._board[games, self._bot_y[games], new_x] == _EMPTY]
+        new_x = self._faller_x[games] + step
+        for row in range(3):
+            rows = self._bot_y[games] - 2 + row
+            self._board[games, rows, self._faller_x[games]] = _EMPTY
+            self._board[games, rows, new_x] = self._jewels[games, row]
+        self._faller_x[games] = new_x
+        self._status[games[self._blocked_below(games)]] = _LANDED
+
+    def rotate_fallers(self, games: numpy.ndarray) -> None:
+        '''Moves the top and middle jewels of each given faller down one spot and the bottom jewel to the top'''
+        games = numpy.asarray(games, dtype=numpy.intp)
+        games = games[(self._status[games] == _FALLING) | (self._status[games] == _LANDED)]
+        self._jewels[games] = numpy.roll(self._jewels[games], 1, axis=1)
+        for row in range(3):
+            self._board[games, self._bot_y[games] - 2 + row, self._faller_x[games]] = self._jewels[games, row]
+
+    def tick(self) -> None:
+        '''
+        Moves every game forward one step: fallers move down, land and freeze, and games without a faller
+        pop one round of matches (letting the rest fall) or, if there is nothing to pop, check for game over
+        '''
+        playing = (~self._game_over).nonzero()[0]
+        self._faller_down(playing[self._status[playing] != _NONE])
+
+        settling = (self._status == _NONE) & ~self._game_over
+        matched = self._matches() & settling[:, None, None]
+        popping = matched.any(axis=(1, 2))
+        if popping.any():
+            self._popped += matched.sum(axis=(1, 2))
+            self._pop_rounds += popping
+            visible = self._board[:, 3:]
+            visible[matched] = _EMPTY
+            self._gravity(popping.nonzero()[0])
+
+        stable = settling & ~popping
+        self._game_over |= stable & (self._board[:, :3] != _EMPTY).any(axis=(1, 2))
+
+    def _faller_down(self, games: numpy.ndarray) -> None:
+        '''Does what ColumnsGame.faller_down does for each of the given games'''
+        blocked = self._blocked_below(games)
+        stopped = games[blocked]
+        status = self._status[stopped]
+        self._status[stopped] = numpy.where(status == _LANDED, _FROZEN, numpy.where(status == _FROZEN, _NONE, _LANDED))
+
+        moving = games[~blocked]
+        x = self._faller_x[moving]
+        bot = self._bot_y[moving]
+        self._board[moving, bot-2, x] = _EMPTY
+        for row in range(3):
+            self._board[moving, bot - 1 + row, x] = self._jewels[moving, row]
+        self._bot_y[moving] = bot + 1
+        self._status[moving[self._blocked_below(moving)]] = _LANDED
+
+    def _blocked_below(self, games: numpy.ndarray) -> numpy.ndarray:
+        '''Returns, for each given game, whether the spot under its bottom faller jewel is the floor or a jewel'''
+        below = self._bot_y[games] + 1
+        on_floor = below >= self._r+3
+        below = numpy.minimum(below, self._r+2)
+        return on_floor | (self._board[games, below, self._faller_x[games]] != _EMPTY)
+
+    def _matches(self) -> numpy.ndarray:
+        '''Returns an (n, r, c) array marking every visible jewel that is part of 3 or more in a line'''
+        board = self._board[:, 3:]
+        filled = board != _EMPTY
+        matched = numpy.zeros(board.shape, dtype=bool)
+
+        #horizontal
+        found = filled[:, :, :-2] & (board[:, :, :-2] == board[:, :, 1:-1]) & (board[:, :, 1:-1] == board[:, :, 2:])
+        matched[:, :, :-2] |= found
+        matched[:, :, 1:-1] |= found
+        matched[:, :, 2:] |= found
+        #vertical
+        found = filled[:, :-2] & (board[:, :-2] == board[:, 1:-1]) & (board[:, 1:-1] == board[:, 2:])
+        matched[:, :-2] |= found
+        matched[:, 1:-1] |= found
+        matched[:, 2:] |= found
+        #diagonally downwards
+        found = filled[:, :-2, :-2] & (board[:, :-2, :-2] == board[:, 1:-1, 1:-1]) & (board[:, 1:-1, 1:-1] == board[:, 2:, 2:])
+        matched[:, :-2, :-2] |= found
+        matched[:, 1:-1, 1:-1] |= found
+        matched[:, 2:, 2:] |= found
+        #diagonally upwards
+        found = filled[:, :-2, 2:] & (board[:, :-2, 2:] == board[:, 1:-1, 1:-1]) & (board[:, 1:-1, 1:-1] == board[:, 2:, :-2])
+        matched[:, :-2, 2:] |= found
+        matched[:, 1:-1, 1:-1] |= found
+        matched[:, 2:, :-2] |= found
+        return matched
+
+    def _gravity(self, games: numpy.ndarray) -> None:
+        '''Packs every column of the given games down, keeping the jewels in the same order'''
+        boards = self._board[games]
+        order = numpy.argsort(boards != _EMPTY, axis=1, kind='stable')
+        self._board[games] = numpy.take_along_axis(boards, order, axis=1)
@@ -0,0 +1,290 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import columns_mechanics
+import columns_simulate
+
+#board sizes (rows, columns) from the normal game up to very large boards
+SIZES = ((13, 6), (26, 12), (52, 24), (104, 48), (208, 96))
+
+def _random_game(rng: random.Random, r: int, c: int) -> columns_mechanics.ColumnsGame:
+    '''Returns a game whose columns are stacked to random heights (up to about two thirds of the board) with random jewels'''
+    heights = [rng.randrange(0, 2*r//3) for col in range(c)]
+    rows = []
+    for row in range(r):
+        rows.append(''.join(rng.choice(columns_mechanics.JEWEL_COLORS) if r-row <= heights[col] else ' ' for col in range(c)))
+    game = columns_mechanics.ColumnsGame(r, c)
+    game.content_board(rows)
+    game.create_board('CONTENTS')
+    return game
+
+def _settle(game: columns_mechanics.ColumnsGame) -> None:
+    '''Ticks the game until there is no faller and nothing left to pop'''
+    while game.get_faller_status() != None or game.is_stable() == False:
+        game.tick()
+
+def _random_faller(rng: random.Random, game: columns_mechanics.ColumnsGame) -> tuple:
+    '''Returns the column and jewels for a faller in a random open column'''
+    open_columns = game.get_open_columns() or [0]
+    return (rng.choice(open_columns),) + tuple(rng.choice(columns_mechanics.JEWEL_COLORS) for i in range(3))
+
+def _percentile(times: list[int], fraction: float) -> float:
+    '''Returns the time (in microseconds) that the given fraction of the sorted times are at or under'''
+    return times[min(len(times)-1, int(fraction*len(times)))] / 1000
+
+def _summary(times: list[int], total: float) -> dict:
+    '''Turns the nanoseconds each call took into calls per second and latency percentiles in microseconds'''
+    times = sorted(times)
+    return {'calls': len(times), 'ops_per_sec': len(times)/total if total > 0 else 0.0,
+            'p50_us': _percentile(times, 0.5), 'p90_us': _percentile(times, 0.9),
+            'p99_us': _percentile(times, 0.99), 'max_us': times[-1]/1000}
+
+def _time_calls(setup, call, repeat: int) -> dict:
+    '''
+    Runs setup then call repeat times, timing only the call
+    setup returns the arguments for call, so nothing it does counts against the call
+    '''
+    times = []
+    for i in range(repeat):
+        args = setup()
+        start = time.perf_counter_ns()
+        call(*args)
+        times.append(time.perf_counter_ns() - start)
+    return _summary(times, sum(times)/1e9)
+
+def bench_size(r: int, c: int, seed: int, repeat: int) -> dict:
+    '''Times each stage of the engine on seeded boards of the given size, returning the results by name'''
+    rng = random.Random(f'{seed}:{r}x{c}')
+    #the hash key of every spot and jewel is made the first time it is used, which shouldn't be timed
+    for row in range(r+3):
+        for col in range(c):
+            for jewel in columns_mechanics.JEWEL_COLORS:
+                columns_mechanics._zobrist_key(row, col, ord(jewel))
+
+    game = _random_game(rng, r, c)
+    _settle(game)
+    stable = game.snapshot()
+    results = {}
+
+    #every call that moves the faller down, from when it is made until it freezes
+    times = []
+    for i in range(max(1, repeat//10)):
+        game.restore(stable)
+        game.create_faller_at(*_random_faller(rng, game))
+        while game.get_faller_status() != None:
+            start = time.perf_counter_ns()
+            game.faller_down()
+            times.append(time.perf_counter_ns() - start)
+    results['faller_down'] = _summary(times, sum(times)/1e9)
+
+    #the jewels above random holes fall down
+    def holes():
+        game.restore(stable)
+        for col in range(c):
+            row = rng.randrange(3, r+3)
+            if game._board[row][col] != columns_mechanics._EMPTY_CODE:
+                #only the benchmark makes holes in the middle of a stack, so it goes straight to the board
+                game._set_cell(row, col, columns_mechanics._EMPTY_CODE)
+        return ()
+    results['gravity'] = _time_calls(holes, game.gravity, repeat)
+
+    #the checks after a faller freezes, which only look at the spots that changed
+    def landed():
+        game.restore(stable)
+        game.create_faller_at(*_random_faller(rng, game))
+        while game.get_faller_status() != None:
+            game.faller_down()
+        return ()
+    results['matching'] = _time_calls(landed, game.matching, repeat)
+
+    #every spot on the board is checked, as when a new board is made
+    def whole_board():
+        game.restore(stable)
+        game._sync_array()
+        return ()
+    results['matching_full'] = _time_calls(whole_board, game.matching, repeat)
+
+    #popping the matches of a random board (including the gravity after it)
+    matched = []
+    for i in range(8):
+        trial = _random_game(rng, r, c)
+        trial.matching()
+        matched.append(trial.snapshot())
+    def with_matches():
+        game.restore(rng.choice(matched))
+        return ()
+    results['pop'] = _time_calls(with_matches, game.pop, repeat)
+
+    #restoring makes a new generation, so the answer is worked out again every time
+    def restored():
+        game.restore(stable)
+        return ()
+    results['check_for_game_over'] = _time_calls(restored, game.check_for_game_over, repeat)
+
+    #making a faller, ticking until it freezes, and popping everything it matched; each cycle is one call, so it
+    #gets as many samples as the other stages for a steady median
+    def cycle(faller: tuple) -> None:
+        game.create_faller_at(*faller)
+        _settle(game)
+    def before_cycle():
+        game.restore(stable)
+        return (_random_faller(rng, game),)
+    results['cycle'] = _time_calls(before_cycle, cycle, repeat)
+
+    return {f'{name}/{r}x{c}': result for name, result in results.items()}
+
+def bench_mass(games: int, seed: int, policy: str, r: int, c: int, processes: int) -> dict:
+    '''Plays many whole games with columns_simulate and times each game'''
+    times = []
+    ticks = 0
+    start = time.perf_counter_ns()
+    last = start
+    for result in columns_simulate.run_simulations(games, seed, policy, r, c, processes=processes):
+        now = time.perf_counter_ns()
+        times.append(now - last)
+        last = now
+        ticks += result['ticks']
+    total = (time.perf_counter_ns() - start)/1e9
+    summary = _summary(times, total)
+    summary['ticks_per_sec'] = ticks/total if total > 0 else 0.0
+    return {f'mass/{policy}/{r}x{c}': summary}
+
+#modules started by headless workers, which should import quickly, and modules that are only reported:
+#the server needs asyncio and the window needs pygame, which take longer than the target on their own
+HEADLESS_MODULES = ('columns_config', 'columns_mechanics', 'columns_simulate')
+OTHER_MODULES = ('columns_server', 'columns_game')
+
+def bench_startup(runs: int) -> dict:
+    '''
+    Times starting a fresh interpreter that imports each module, taking away the time of one that imports nothing
+    so only the cost of the import is left; the fastest of the runs is kept as the ops/sec, since it is the least noisy
+    An import that takes less than the spread of the bare starts is marked below noise instead of given an ops/sec,
+    and a module that can't be imported here (the window without pygame) is marked unavailable
+    The interpreters start in the folder of this file, so the modules are found wherever the benchmark is run from
+    '''
+    folder = os.path.dirname(os.path.abspath(__file__))
+    def start(code: str) -> list[int]:
+        times = []
+        for i in range(runs):
+            begin = time.perf_counter_ns()
+            subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, cwd=folder)
+            times.append(time.perf_counter_ns() - begin)
+        return times
+
+    bare_times = sorted(start('pass'))
+    bare = bare_times[0]
+    noise = bare_times[len(bare_times)//2] - bare
+    results = {}
+    for module in HEADLESS_MODULES + OTHER_MODULES:
+        try:
+            times = [max(0, elapsed - bare) for elapsed in start(f'import {module}')]
+        except subprocess.CalledProcessError as error:
+            lines = error.stderr.decode('utf-8', 'replace').strip().splitlines()
+            results[f'startup/{module}'] = {'unavailable': lines[-1] if lines != [] else f'exit status {error.returncode}'}
+            continue
+        summary = _summary(times, min(times)*len(times)/1e9)
+        summary['import_ms'] = min(times)/1e6
+        summary['below_noise'] = min(times) <= noise
+        if summary['below_noise'] == True:
+            summary['ops_per_sec'] = None
+        results[f'startup/{module}'] = summary
+    return results
+
+def check_startup(results: dict, target_ms: float) -> list[str]:
+    '''Returns the headless modules whose fastest import took longer than the target, or that couldn't be imported at all'''
+    slow = []
+    for module in HEADLESS_MODULES:
+        result = results.get(f'startup/{module}')
+        if result != None and ('unavailable' in result or result['import_ms'] > target_ms):
+            slow.append(f'startup/{module}')
+    return slow
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    '''
+    Returns the names of the benchmarks whose median call got more than threshold (a fraction) slower than the baseline,
+    counted as calls per second at the median; the median is used instead of ops/sec from the mean, which a few slow
+    calls (a collection, another process) can move on their own
+    '''
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not _has_rate(result) or before == None or not _has_rate(before):
+            continue
+        if _median_speedup(result, before) < 1-threshold:
+            regressions.append(name)
+    return regressions
+
+def _median_speedup(result: dict, before: dict) -> float:
+    '''Returns how many times faster the median call is than in the baseline (below 1 is slower)'''
+    if result['p50_us'] <= 0 or before['p50_us'] <= 0:
+        return 1.0
+    return before['p50_us']/result['p50_us']
+
+def _has_rate(result: dict) -> bool:
+    '''Returns False for a startup result that was unavailable or below noise, which has no ops/sec to compare'''
+    return result.get('ops_per_sec') != None
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Times the hot paths of columns_mechanics on seeded boards and saves the results as JSON')
+    parser.add_argument('--sizes', default=','.join(f'{r}x{c}' for r, c in SIZES), help='board sizes such as 13x6,52x24')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=500, help='calls timed for each stage and size')
+    parser.add_argument('--games', type=int, default=200, help='games played for the mass run (0 to skip it)')
+    parser.add_argument('--policy', choices=sorted(columns_simulate.POLICIES), default='random')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--startup-runs', type=int, default=10, help='interpreters started to time each import (0 to skip it)')
+    parser.add_argument('--startup-target-ms', type=float, default=25.0,
+                        help='longest a headless module may take to import on top of starting the interpreter')
+    parser.add_argument('--output', default=None, help='writes the results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='JSON file from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='how much slower than the baseline the median call can get before it counts as a regression')
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes.split(','):
+        r, c = (int(part) for part in size.split('x'))
+        results.update(bench_size(r, c, args.seed, args.repeat))
+    if args.games > 0:
+        results.update(bench_mass(args.games, args.seed, args.policy, 13, 6, args.processes))
+    if args.startup_runs > 0:
+        results.update(bench_startup(args.startup_runs))
+
+    baseline = None
+    if args.baseline != None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+    regressions = [] if baseline == None else compare(results, baseline, args.threshold)
+    regressions += [name for name in check_startup(results, args.startup_target_ms) if name not in regressions]
+
+    print(f'{"benchmark":36} {"ops/sec":>12} {"p50 us":>10} {"p90 us":>10} {"p99 us":>10} {"vs base":>8}')
+    for name, result in results.items():
+        if 'unavailable' in result:
+            print(f'{name:36} {"unavailable":>12}  {result["unavailable"]}')
+            continue
+        if result.get('below_noise') == True:
+            print(f'{name:36} {"below noise":>12}  {result["import_ms"]:.3f} ms over a bare start')
+            continue
+        change = ''
+        if baseline != None and name in baseline and _has_rate(baseline[name]):
+            change = f'{_median_speedup(result, baseline[name]):.2f}x'
+        flag = '  REGRESSION' if name in regressions else ''
+        print(f'{name:36} {result["ops_per_sec"]:12.1f} {result["p50_us"]:10.2f} {result["p90_us"]:10.2f} '
+              f'{result["p99_us"]:10.2f} {change:>8}{flag}')
+
+    if args.output != None:
+        with open(args.output, 'w') as file:
+            json.dump({'python': platform.python_version(), 'seed': args.seed, 'repeat': args.repeat, 'results': results},
+                      file, indent=2)
+    if regressions != []:
+        print(f'{len(regressions)} benchmark(s) slower than the baseline or the startup target, or not importable', file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,456 @@
+import columns_mechanics
+from columns_mechanics import InvalidMoveError, GameOverError
+
+class BitboardColumnsGame():
+    '''
+    Plays the same game as columns_mechanics.ColumnsGame, but keeps the board as one integer bitmask per jewel color
+    The spot (row, col) is bit row*(c+1) + col, so every row has one extra empty bit at the end that stops
+    matches and moves from wrapping around onto the next row
+    The methods that change the game return None instead of the board; get_board builds it when it is needed
+    It has the methods of ColumnsGame that columns_ai and columns_simulate use (tick, clone, snapshot, restore,
+    get_hash, save_state and the rest), and scores pops the same way, so either engine can play the same games
+    '''
+    def __init__(self, r: int, c: int):
+        self._r = r
+        self._c = c
+
+        self._stride = c+1
+        self._rows = r+3
+        row_mask = (1 << c) - 1
+        self._full = 0
+        for row in range(self._rows):
+            self._full |= row_mask << (row*self._stride)
+        #the three rows above the user's board, and the rows the user can see
+        self._hidden = self._full & ((1 << (3*self._stride)) - 1)
+        self._visible = self._full & ~self._hidden
+
+        self._begin_board = []
+        self._masks = {}
+        #every spot with a jewel in it, kept up to date along with the masks
+        self._occupied = 0
+        #matched spots, how many jewels past three the matched lines have, and the generation they were found for
+        self._matched = 0
+        self._longer = 0
+        self._matched_generation = None
+        #goes up on every change to the masks
+        self._generation = 0
+
+        #jewels popped, points scored, and rounds popped since the last faller was made
+        self._popped = 0
+        self._score = 0
+        self._chain = 0
+
+        self._top_jewel = None
+        self._mid_jewel = None
+        self._bot_jewel = None
+
+        self._faller_x = None
+        self._top_y = None
+        self._mid_y = None
+        self._bot_y = None
+
+        self._faller_type = None
+
+    def get_bot_coords(self) -> tuple:
+        return (self._bot_y,self._faller_x)
+
+    def get_mid_coords(self) -> tuple:
+        return (self._mid_y,self._faller_x)
+
+    def get_top_coords(self) -> tuple:
+        return (self._top_y,self._faller_x)
+
+    def get_board(self) -> list[list[str]]:
+        '''Builds the board as a list of list of strings, the same way ColumnsGame stores it'''
+        board = [[' ']*self._c for row in range(self._rows)]
+        for jewel, mask in self._masks.items():
+            while mask:
+                bit = mask & -mask
+                row, col = divmod(bit.bit_length()-1, self._stride)
+                board[row][col] = jewel
+                mask ^= bit
+        return board
+
+    def get_board_bytes(self) -> bytes:
+        '''Returns the board as bytes, one jewel letter (or a space) for each spot, row after row'''
+        board = bytearray(b' '*(self._rows*self._c))
+        for jewel, mask in self._masks.items():
+            code = ord(jewel)
+            while mask:
+                bit = mask & -mask
+                row, col = divmod(bit.bit_length()-1, self._stride)
+                board[row*self._c + col] = code
+                mask ^= bit
+        return bytes(board)
+
+    def get_jewel(self, row: int, col: int) -> str:
+        '''Returns the jewel in one spot of the board, or a space if it is empty'''
+        bit = 1 << (row*self._stride + col)
+        self._generation += 1
+        if self._occupied & bit:
+            for jewel, mask in self._masks.items():
+                if mask & bit:
+                    return jewel
+        return ' '
+
+    def get_popped(self) -> int:
+        '''Returns how many jewels have been popped so far'''
+        return self._popped
+
+    def get_score(self) -> int:
+        '''Returns the points scored so far, worked out the same way as ColumnsGame'''
+        return self._score
+
+    def get_chain(self) -> int:
+        '''Returns how many rounds of pops there have been since the last faller was made'''
+        return self._chain
+
+    def get_generation(self) -> int:
+        '''Returns a number that goes up every time something on the board changes'''
+        return self._generation
+
+    def get_hash(self) -> int:
+        '''Returns the same 64 bit zobrist hash as ColumnsGame.get_hash would for this board, worked out from the masks'''
+        board_hash = 0
+        for jewel, mask in self._masks.items():
+            code = ord(jewel)
+            while mask:
+                bit = mask & -mask
+                row, col = divmod(bit.bit_length()-1, self._stride)
+                board_hash ^= columns_mechanics._zobrist_key(row, col, code)
+                mask ^= bit
+        return board_hash
+
+    def get_faller_status(self) -> str:
+        '''Returns whether the faller is falling, landed, or frozen'''
+        return self._faller_type
+
+    def get_matched(self) -> list[tuple]:
+        return self._coords(self._matched)
+
+    def create_board(self, command: str) -> None:
+        '''Given the command to either make an empty or pre determined board, fills in the masks for the board'''
+        if self._c >= 3 and self._r >= 4:
+            self._masks = {}
+            self._occupied = 0
+            self._generation += 1
+            if command == 'CONTENTS':
+                for row in range(len(self._begin_board)):
+                    for col in range(self._c):
+                        if self._begin_board[row][col] != ' ':
+                            self._set_cell(row, col, self._begin_board[row][col])
+            self.gravity()
+            self.matching()
+        else:
+            raise ValueError
+
+    def content_board(self, board: list[list[str]]) -> list[list[str]]:
+        '''Turns the patterns of strings given to the function into a list of list of strings with either
+        the jewel color or a space, to be put on the board by create_board'''
+        self._begin_board = [[' ']*self._c for row in range(3)]
+        for row in board:
+            self._begin_board.append(list(row))
+        return self._begin_board
+
+    def faller_down(self) -> None:
+        '''
+        Checks if there is a value under the jewel, and if there is, the jewel moves down
+        Changes the faller type to either landed or frozen depending on whether a jewel was already under it or not
+        '''
+        if self._bot_y != None and self._faller_x != None:
+            if self._is_blocked(self._bot_y+1, self._faller_x):
+                if self._faller_type == 'landed':
+                    self._faller_type = 'frozen'
+                elif self._faller_type == 'frozen':
+                    self._reset_faller()
+                else:
+                    self._faller_type = 'landed'
+            else:
+                self._set_cell(self._bot_y+1, self._faller_x, self._bot_jewel)
+                self._set_cell(self._bot_y, self._faller_x, self._mid_jewel)
+                self._set_cell(self._mid_y, self._faller_x, self._top_jewel)
+                self._set_cell(self._top_y, self._faller_x, ' ')
+                self._bot_y, self._mid_y, self._top_y = self._bot_y+1, self._mid_y+1, self._top_y+1
+                if self._is_blocked(self._bot_y+1, self._faller_x):
+                    self._faller_type = 'landed'
+
+    def gravity(self) -> None:
+        '''
+        All the non-faller jewels will automatically go as far down as they can before landing on another jewel
+        Every jewel with an empty spot under it drops one row per step, for all columns and colors at once
+        '''
+        if self._faller_type == None or self._faller_type == 'frozen':
+            occupied = self._occupied
+            while True:
+                falling = occupied & ((self._full & ~occupied) >> self._stride)
+                if falling == 0:
+                    break
+                for jewel, mask in self._masks.items():
+                    moving = mask & falling
+                    if moving:
+                        self._masks[jewel] = (mask ^ moving) | (moving << self._stride)
+                occupied = (occupied ^ falling) | (falling << self._stride)
+                self._generation += 1
+            self._occupied = occupied
+
+    def create_faller(self, command: str) -> None:
+        '''Creates a faller on the top 3 rows of the board and assigns the location of each faller to an x and y value
+        Assigns the faller type as falling automatically'''
+        command = command.split(' ')
+        self.create_faller_at(int(command[1])-1, command[2], command[3], command[4])
+
+    def create_faller_at(self, faller_col: int, top: str, mid: str, bot: str) -> None:
+        '''Does the same as create_faller, but is given the column (starting from 0) and the three jewels
+        A column that isn't on the board raises InvalidMoveError before anything about the game is changed'''
+        if self.check_for_game_over() == False:
+            if self._faller_type == None or self._faller_type == 'frozen':
+                if not 0 <= faller_col < self._c:
+                    raise InvalidMoveError
+                self._faller_type = 'falling'
+                #a new faller ends the chain
+                self._chain = 0
+
+                self._faller_x = faller_col
+                self._bot_y = 2
+                self._mid_y = 1
+                self._top_y = 0
+
+                self._bot_jewel = bot
+                self._mid_jewel = mid
+                self._top_jewel = top
+
+                self._set_cell(self._bot_y, self._faller_x, self._bot_jewel)
+                self._set_cell(self._mid_y, self._faller_x, self._mid_jewel)
+                self._set_cell(self._top_y, self._faller_x, self._top_jewel)
+
+                self.faller_down()
+        else:
+            raise GameOverError
+
+    def move_faller_right(self) -> None:
+        '''Moves the faller right if there is no jewel to the right of the bottom jewel'''
+        self._move_faller(1)
+
+    def move_faller_left(self) -> None:
+        '''Moves the faller left if there is no jewel to the left of the bottom jewel'''
+        self._move_faller(-1)
+
+    def can_move(self, direction: str) -> bool:
+        '''Checks if there are any jewels next to the bottom faller jewel'''
+        if direction == 'right':
+            if self._faller_x+1 < self._c:
+                return not self._is_blocked(self._bot_y, self._faller_x+1)
+        if direction == 'left':
+            if self._faller_x-1 >= 0:
+                return not self._is_blocked(self._bot_y, self._faller_x-1)
+
+    def get_open_columns(self) -> list[int]:
+        '''Returns the columns (starting from 0) that still have room for a new faller on the user's board'''
+        occupied = self._occupied >> (3*self._stride)
+        return [col for col in range(self._c) if not (occupied >> col) & 1]
+
+    def rotate_faller(self) -> None:
+        '''
+        Moves the top and middle faller jewel to the middle and bottom faller jewel spot respectively
+        Moves the bottom faller jewel to the top faller jewel position
+        '''
+        if self.check_for_game_over() == False:
+            if self._faller_type != 'frozen' and self._faller_type != None:
+                bot, mid, top = self._bot_jewel, self._mid_jewel, self._top_jewel
+                self._set_cell(self._bot_y, self._faller_x, mid)
+                self._set_cell(self._mid_y, self._faller_x, top)
+                self._set_cell(self._top_y, self._faller_x, bot)
+
+                self._bot_jewel = mid
+                self._mid_jewel = top
+                self._top_jewel = bot
+        else:
+            raise GameOverError
+
+    def matching(self) -> None:
+        '''
+        If three or more jewels match either vertically, horizontally, or diagonally, it will mark the jewels
+        Each color and direction is checked for the whole board with m & (m >> d) & (m >> 2d), which has one bit
+        for each three in a row, so a line of n jewels has n-2 bits of which the first is the start of the line
+        Nothing is worked out again until the masks change
+        '''
+        if (self._faller_type == 'frozen' or self._faller_type == None) and self._matched_generation != self._generation:
+            matched = 0
+            longer = 0
+            #horizontal, vertical, diagonally downwards, diagonally upwards
+            steps = (1, self._stride, self._stride+1, self._stride-1)
+            for mask in self._masks.values():
+                mask &= self._visible
+                for step in steps:
+                    found = mask & (mask >> step) & (mask >> 2*step)
+                    if found:
+                        matched |= found | (found << step) | (found << 2*step)
+                        longer += found.bit_count() - (found & ~(found << step)).bit_count()
+            self._matched, self._longer = matched, longer
+            self._matched_generation = self._generation
+
+    def pop(self) -> None:
+        '''Removes the matched jewels from every mask, then lets the rest fall
+        Each round of pops scores more the later it comes in a chain'''
+        if self._faller_type == None:
+            if self._matched:
+                popped = self._matched.bit_count()
+                self._chain += 1
+                self._score += columns_mechanics._round_score(popped, self._longer, self._chain)
+                self._popped += popped
+                for jewel in self._masks:
+                    self._masks[jewel] &= ~self._matched
+                self._occupied &= ~self._matched
+                self._generation += 1
+            self._matched = 0
+            self._longer = 0
+            self.gravity()
+
+    def resolve_chains(self) -> int:
+        '''
+        Pops every round of matches, letting the rest fall and matching again each time, until the board is stable
+        Only does anything once there is no faller; returns how many rounds were popped
+        '''
+        rounds = 0
+        if self._faller_type == None:
+            while self.is_stable() == False:
+                self.pop()
+                rounds += 1
+        return rounds
+
+    def tick(self) -> None:
+        '''
+        Moves the game forward one step of time: the faller moves down, lands, freezes and then goes away
+        Once there is no faller, one round of matches is popped per step
+        '''
+        self.faller_down()
+        if self._faller_type == None:
+            self.no_matches()
+
+    def no_matches(self) -> bool:
+        '''Checks if there are no more matches to be made, and pops the matched jewels if there are
+        Returns True if nothing was popped'''
+        if self._faller_type == 'frozen' or self._faller_type == None:
+            if self.is_stable() == True:
+                return True
+            self.pop()
+            return False
+
+    def is_stable(self) -> bool:
+        '''Returns True if there is no faller moving and no jewels left to match, without changing the board'''
+        if self._faller_type == 'frozen' or self._faller_type == None:
+            self.matching()
+            return self._matched == 0
+        return False
+
+    def check_for_game_over(self) -> bool:
+        '''Checks if any jewels are in the hidden rows once the board is stable
+        Returns False if the game isn't over, True if the game is over'''
+        return self.is_stable() and self._occupied & self._hidden != 0
+
+    def clone(self) -> 'BitboardColumnsGame':
+        '''Returns a separate game in the same state; the masks are plain integers so nothing else is copied'''
+        game = BitboardColumnsGame.__new__(BitboardColumnsGame)
+        game.__dict__.update(self.__dict__)
+        game._masks = dict(self._masks)
+        return game
+
+    def snapshot(self) -> tuple:
+        '''Returns the state of the game so it can be put back later with restore'''
+        return (tuple(self._masks.items()), self._occupied, self._matched, self._longer, self._matched_generation,
+                (self._top_jewel, self._mid_jewel, self._bot_jewel, self._faller_x, self._top_y, self._mid_y, self._bot_y,
+                 self._faller_type),
+                self._popped, self._score, self._chain, self._generation)
+
+    def restore(self, snapshot: tuple) -> None:
+        '''Puts the game back to the state it was in when the snapshot was taken'''
+        masks, self._occupied, self._matched, self._longer, self._matched_generation, faller, \
+            self._popped, self._score, self._chain, self._generation = snapshot
+        self._masks = dict(masks)
+        (self._top_jewel, self._mid_jewel, self._bot_jewel, self._faller_x, self._top_y, self._mid_y, self._bot_y,
+         self._faller_type) = faller
+
+    def save_state(self) -> bytes:
+        '''Packs the board and the faller into the same bytes as ColumnsGame.save_state, so replays work with either engine'''
+        faller = [-1 if value == None else value for value in (self._faller_x, self._top_y, self._mid_y, self._bot_y)]
+        jewels = bytes(0 if jewel == None else ord(jewel) for jewel in (self._top_jewel, self._mid_jewel, self._bot_jewel))
+        return self.get_board_bytes() + columns_mechanics._STATE_FORMAT.pack(
+            *faller, jewels, columns_mechanics._STATUS_CODES[self._faller_type], self._popped, self._score, self._chain)
+
+    def load_state(self, data: bytes) -> None:
+        '''Puts the game in the state packed by save_state (of either engine)'''
+        size = self._rows*self._c
+        self._masks = {}
+        self._occupied = 0
+        for index in range(size):
+            if data[index] != columns_mechanics._EMPTY_CODE:
+                self._set_cell(index // self._c, index % self._c, chr(data[index]))
+        self._generation += 1
+
+        faller_x, top_y, mid_y, bot_y, jewels, status, self._popped, self._score, self._chain = \
+            columns_mechanics._STATE_FORMAT.unpack_from(data, size)
+        self._faller_x, self._top_y, self._mid_y, self._bot_y = [None if value == -1 else value for value in (faller_x, top_y, mid_y, bot_y)]
+        self._top_jewel, self._mid_jewel, self._bot_jewel = [None if jewel == 0 else chr(jewel) for jewel in jewels]
+        self._faller_type = columns_mechanics._STATUS_NAMES[status]
+
+    def key(self) -> tuple:
+        '''Returns a hashable value that is the same for two games in the same state'''
+        return (tuple(sorted((jewel, mask) for jewel, mask in self._masks.items() if mask)),
+                self._faller_type, self._faller_x, self._bot_y, self._top_jewel, self._mid_jewel, self._bot_jewel)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, BitboardColumnsGame) and self.key() == other.key()
+
+    def __hash__(self) -> int:
+        return hash(self.key())
+
+    def _move_faller(self, step: int) -> None:
+        '''Moves the three faller jewels one column over if there is room, and checks if the faller landed'''
+        if self.check_for_game_over() == False:
+            if self._faller_type != 'frozen' and self._faller_type != None:
+                if self.can_move('right' if step == 1 else 'left') == True:
+                    self._set_cell(self._bot_y, self._faller_x, ' ')
+                    self._set_cell(self._mid_y, self._faller_x, ' ')
+                    self._set_cell(self._top_y, self._faller_x, ' ')
+
+                    self._faller_x += step
+                    self._set_cell(self._top_y, self._faller_x, self._top_jewel)
+                    self._set_cell(self._mid_y, self._faller_x, self._mid_jewel)
+                    self._set_cell(self._bot_y, self._faller_x, self._bot_jewel)
+                if self._is_blocked(self._bot_y+1, self._faller_x):
+                    self._faller_type = 'landed'
+        else:
+            raise GameOverError
+
+    def _is_blocked(self, row: int, col: int) -> bool:
+        '''Returns True if the spot is under the bottom of the board or has a jewel in it'''
+        return row >= self._rows or (self._occupied >> (row*self._stride + col)) & 1 == 1
+
+    def _set_cell(self, row: int, col: int, jewel: str) -> None:
+        '''Puts the jewel (or a space) in the given spot by clearing that bit from every mask and setting it in one
+        The masks are only cleared if the spot had a jewel in it'''
+        bit = 1 << (row*self._stride + col)
+        self._generation += 1
+        if self._occupied & bit:
+            for color in self._masks:
+                self._masks[color] &= ~bit
+            self._occupied ^= bit
+        if jewel != ' ':
+            self._masks[jewel] = self._masks.get(jewel, 0) | bit
+            self._occupied |= bit
+
+    def _coords(self, mask: int) -> list[tuple]:
+        '''Turns a mask into the list of (row, col) spots it has set'''
+        coords = []
+        while mask:
+            bit = mask & -mask
+            coords.append(divmod(bit.bit_length()-1, self._stride))
+            mask ^= bit
+        return coords
+
+    def _reset_faller(self) -> None:
+        '''Does not assign anything to the faller variables until another faller is made'''
+        self._faller_x = None
+        self._top_y = None
+        self._mid_jewel = None
+        self._faller_type = None
@@ -0,0 +1,143 @@
+import sys
+
+import columns_mechanics
+
+#first byte of each command line
+_RETURN = ord('\r')
+_FALLER = ord('F')
+_LEFT = ord('<')
+_RIGHT = ord('>')
+_ROTATE = ord('R')
+_QUIT = ord('Q')
+_SPACE = ord(' ')
+_ZERO = ord('0')
+_NINE = ord('9')
+_JEWELS = frozenset(ord(jewel) for jewel in columns_mechanics.JEWEL_COLORS)
+
+def replay(stream, game: columns_mechanics.ColumnsGame, out=None, echo: bool = False, chunk_size: int = 1 << 20) -> int:
+    '''
+    Reads commands from a binary stream in large chunks and applies them to the game:
+    'F col a b c' makes a faller, '<' and '>' move it, 'R' rotates it, a blank line is one tick and 'Q' stops
+    The board is only written to out after every command if echo is True, otherwise once at the end
+    Returns how many commands were applied
+    '''
+    counter = [0]
+    try:
+        _apply_commands(stream, game, out if echo == True else None, chunk_size, counter)
+    except columns_mechanics.GameOverError:
+        if out != None:
+            if echo == False:
+                write_board(game, out)
+            out.write('GAME OVER\n')
+        return counter[0]
+    if echo == False and out != None:
+        write_board(game, out)
+    return counter[0]
+
+def _apply_commands(stream, game: columns_mechanics.ColumnsGame, out, chunk_size: int, counter: list[int]) -> None:
+    '''
+    Applies every command in the stream to the game, looking at each line byte by byte instead of splitting it
+    Lines cut off at the end of a chunk are finished with the start of the next one
+    '''
+    moves = {_LEFT: game.move_faller_left, _RIGHT: game.move_faller_right, _ROTATE: game.rotate_faller}
+    leftover = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        at_end = chunk == b''
+        data = leftover + chunk if leftover else chunk
+        start = 0
+        while True:
+            end = data.find(b'\n', start)
+            if end == -1:
+                if at_end and start < len(data):
+                    #the last line doesn't have to end with a newline
+                    end = len(data)
+                else:
+                    break
+            line_end = end
+            if line_end > start and data[line_end-1] == _RETURN:
+                line_end -= 1
+
+            if line_end == start:
+                game.tick()
+                if game.check_for_game_over() == True:
+                    raise columns_mechanics.GameOverError
+            else:
+                command = data[start]
+                if command == _FALLER:
+                    #'F', a space, the column number, then three jewels each after a space
+                    pos = start+2
+                    col = 0
+                    while pos < line_end and data[pos] != _SPACE:
+                        if not _ZERO <= data[pos] <= _NINE:
+                            break
+                        col = col*10 + data[pos] - _ZERO
+                        pos += 1
+                    if pos == start+2 or pos+5 >= line_end or data[start+1] != _SPACE \
+                    or any(data[pos+i] != _SPACE or data[pos+i+1] not in _JEWELS for i in (0, 2, 4)):
+                        raise ValueError(f'bad faller command {bytes(data[start:line_end])!r}')
+                    game.create_faller_at(col-1, chr(data[pos+1]), chr(data[pos+3]), chr(data[pos+5]))
+                elif command == _QUIT:
+                    return
+                elif command in moves:
+                    moves[command]()
+                else:
+                    raise ValueError(f'unknown command {bytes(data[start:line_end])!r}')
+            counter[0] += 1
+            if out != None:
+                write_board(game, out)
+            start = end+1
+        if at_end:
+            return
+        leftover = data[start:]
+
+def write_board(game: columns_mechanics.ColumnsGame, out) -> None:
+    '''Writes the rows of the board the user can see, with the faller jewels in brackets'''
+    board = game.get_board()
+    status = game.get_faller_status()
+    faller = ()
+    if status == 'falling' or status == 'landed':
+        faller = (game.get_top_coords(), game.get_mid_coords(), game.get_bot_coords())
+    lines = []
+    for row in range(3, len(board)):
+        cells = []
+        for col in range(len(board[row])):
+            if (row, col) in faller:
+                cells.append(('[' if status == 'falling' else '|') + board[row][col] + (']' if status == 'falling' else '|'))
+            else:
+                cells.append(' ' + board[row][col] + ' ')
+        lines.append('|' + ''.join(cells) + '|\n')
+    lines.append(' ' + '-'*(3*len(board[0])) + ' \n')
+    out.write(''.join(lines))
+
+def read_game(stream) -> columns_mechanics.ColumnsGame:
+    '''
+    Reads the start of a command stream: the number of rows, the number of columns, then EMPTY or CONTENTS
+    (followed by one line per row) and returns the game it describes
+    '''
+    r = int(stream.readline())
+    c = int(stream.readline())
+    game = columns_mechanics.ColumnsGame(r, c)
+    command = stream.readline().strip().decode('ascii')
+    if command == 'CONTENTS':
+        rows = []
+        for i in range(r):
+            rows.append(stream.readline().rstrip(b'\r\n').decode('ascii').ljust(c))
+        game.content_board(rows)
+    game.create_board(command)
+    return game
+
+def main() -> None:
+    '''Replays the command file given on the command line (or standard input) and prints the final board'''
+    echo = '--echo' in sys.argv[1:]
+    paths = [arg for arg in sys.argv[1:] if arg != '--echo']
+    if paths != []:
+        with open(paths[0], 'rb') as stream:
+            game = read_game(stream)
+            replay(stream, game, sys.stdout, echo)
+    else:
+        game = read_game(sys.stdin.buffer)
+        replay(sys.stdin.buffer, game, sys.stdout, echo)
+
+if __name__ == '__main__':
+    main()
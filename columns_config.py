@@ -0,0 +1,22 @@
+#settings shared by the frontends, kept free of pygame so they can be imported anywhere
+
+#rows and columns of the user's board
+ROWS = 13
+COLUMNS = 6
+
+#size of the window when the game starts
+INITIAL_WIDTH = 600
+INITIAL_HEIGHT = 600
+
+#milliseconds between each step the faller falls
+FALL_INTERVAL = 1000
+
+#colors as (red, green, blue)
+BACKGROUND_COLOR = (57, 62, 65)
+BOARD_COLOR = (84, 73, 75)
+TEXT_BACKGROUND_COLOR = (255, 255, 255)
+TEXT_COLOR = (0, 0, 0)
+
+#the color each jewel letter is drawn in
+JEWEL_COLORS = {'S': (241, 247, 237), 'W': (145, 199, 177), 'T': (179, 57, 81),
+                'X': (227, 208, 129), 'Y': (238, 150, 75), 'Z': (100, 255, 169)}
@@ -0,0 +1,106 @@
+import random
+import time
+
+import columns_config
+import columns_mechanics
+import columns_replay
+
+_FALL_INTERVAL = columns_config.FALL_INTERVAL
+
+#the moves a frontend can make, in the text protocol
+_MOVES = {'<': 'move_faller_left', '>': 'move_faller_right', 'R': 'rotate_faller'}
+
+class GameDriver():
+    '''
+    Plays one game for a frontend: the faller falls on its own clock, a new random faller is made once the last one
+    is gone and its matches are popped, and every faller, move and tick is written to a replay file if one is given
+    The frontend draws the game and passes on the user's moves, and asks how long it can wait before calling fall_when_due
+    '''
+    def __init__(self, seed: int = None, fall_interval: int = _FALL_INTERVAL, record_path: str = None):
+        self.game = columns_mechanics.ColumnsGame(columns_config.ROWS, columns_config.COLUMNS)
+        self._random = random.Random(seed)
+        self.game.create_board('EMPTY')
+
+        #every faller, move and tick is written to the replay file if one is given
+        self._recorder = None
+        if record_path != None:
+            self._recorder = columns_replay.ReplayWriter(record_path, self.game, '' if seed == None else seed)
+
+        self.game_over = False
+
+        #the faller falls on its own clock, so how often it falls doesn't depend on how often the frontend draws
+        self._fall_interval = fall_interval
+        self._next_fall = None
+        self._paused_at = None
+
+    def start(self) -> None:
+        '''Starts the fall clock, so the first faller is made straight away'''
+        self._next_fall = now()
+
+    def time_to_fall(self) -> int:
+        '''Returns the milliseconds until the faller is next due to fall, which is negative once it is overdue'''
+        return self._next_fall - now()
+
+    def fall_when_due(self) -> None:
+        '''
+        Makes an idle move for every fall interval that has passed, counting from when the last one was due
+        instead of when it happened, so the faller keeps the same speed even if the game falls behind
+        '''
+        current = now()
+        while current >= self._next_fall and self.game_over == False:
+            self._idle_move()
+            self._next_fall += self._fall_interval
+
+    def move(self, command: str) -> None:
+        '''Moves the faller left ('<') or right ('>') or rotates it ('R'), and records the move'''
+        try:
+            getattr(self.game, _MOVES[command])()
+        except columns_mechanics.GameOverError:
+            self.game_over = True
+            return
+        self._record(command)
+
+    def pause(self) -> None:
+        '''Stops the fall clock until resume is called'''
+        self._paused_at = now()
+
+    def resume(self) -> None:
+        '''Starts the fall clock again, so the faller picks up where it left off'''
+        self._next_fall += now() - self._paused_at
+
+    def close(self) -> None:
+        if self._recorder != None:
+            self._recorder.close()
+
+    def _idle_move(self) -> None:
+        '''Makes the faller fall; once it is gone, matches are popped one round per move before the next faller is made'''
+        popped = self.game.get_popped()
+        self._tick()
+        if self.game.get_faller_status() == 'frozen':
+            #clears the frozen faller so its matches can be popped
+            self._tick()
+        if self.game.get_faller_status() == None and self.game.get_popped() == popped:
+            self.game_over = self.game.check_for_game_over()
+            if self.game_over == False:
+                self._make_faller()
+
+    def _make_faller(self) -> None:
+        '''Randomly selects colors to create a faller, using the game's own random generator so a seed replays the same game'''
+        faller = columns_mechanics.random_faller(self._random, self.game)
+        self.game.create_faller(faller)
+        self._record(faller)
+
+    def _record(self, command: str) -> None:
+        '''Writes a command to the replay file, if the game is being recorded'''
+        if self._recorder != None:
+            self._recorder.record(command)
+
+    def _tick(self) -> None:
+        '''Moves the game forward one step, writing the step to the replay file if the game is being recorded'''
+        self.game.tick()
+        if self._recorder != None:
+            self._recorder.tick(self.game)
+
+def now() -> int:
+    '''Returns the time in milliseconds, from a clock that works without pygame or curses started'''
+    return time.monotonic_ns() // 1000000
@@ -1,23 +1,27 @@
-import columns_mechanics
+import argparse
+import columns_config
+import columns_driver
+import columns_profile
 import pygame
-import random
-
-_INITIAL_WIDTH = 600
-_INITIAL_HEIGHT = 600
-_BACKGROUND_COLOR = pygame.Color(57, 62, 65)
-_BOARD_COLOR = pygame.Color(84,73,75)
-_S_COLOR = pygame.Color(241, 247, 237)
-_W_COLOR = pygame.Color(145, 199, 177)
-_T_COLOR = pygame.Color(179, 57, 81)
-_X_COLOR = pygame.Color(227, 208, 129)
-_Y_COLOR = pygame.Color(238, 150, 75)
-_Z_COLOR = pygame.Color(100, 255, 169)
+
+_INITIAL_WIDTH = columns_config.INITIAL_WIDTH
+_INITIAL_HEIGHT = columns_config.INITIAL_HEIGHT
+_BACKGROUND_COLOR = columns_config.BACKGROUND_COLOR
+_BOARD_COLOR = columns_config.BOARD_COLOR
+_COLORS = columns_config.JEWEL_COLORS
+_FALL_INTERVAL = columns_config.FALL_INTERVAL
+_ROWS = columns_config.ROWS
+_COLUMNS = columns_config.COLUMNS
+
+#the methods of the frontend that are timed while the profiling overlay is showing
+_FRONTEND_STAGES = {'_apply_events': 'events', '_draw_jewels': 'draw jewels', '_show': 'display flip'}
 
 class ColumnsGame:
-    def __init__(self):
-        self._game = columns_mechanics.ColumnsGame(13,6)
-        self._game.create_board('EMPTY')
-        self._state = self._game.get_board()
+    def __init__(self, seed: int = None, fall_interval: int = _FALL_INTERVAL, record_path: str = None,
+                 profile_path: str = None):
+        #plays the game (falls, new fallers and recording); the window only draws it and passes on the user's moves
+        self._driver = columns_driver.GameDriver(seed, fall_interval, record_path)
+        self._game = self._driver.game
 
         self._running = True
 
@@ -25,76 +29,203 @@ class ColumnsGame:
         self._jewel_center_y = None
         self._board_width = None
         self._board_height = None
-
-        self._game_over = False
-
-        self._clock = pygame.time.Clock()
+        self._board_left = None
+        self._board_top = None
+
+        #pictures of each jewel for the current box size, and what was last drawn in each spot of the board
+        self._sprites = {}
+        self._drawn = {}
+        #spots the faller was drawn in, and spots that have to be drawn again even though the board didn't change there
+        self._faller_spots = ()
+        self._stale = set()
+        self._surface_size = None
+        self._drawn_state = None
+
+        self._paused = False
+
+        self._font = None
+        self._texts = {}
+
+        #F3 shows how long each stage of the last frames took; nothing is timed while it is hidden, unless the
+        #frames are being saved to profile_path, in which case everything is timed from the start
+        self._profiler = None
+        self._profile_path = profile_path
+        self._overlay = False
+        self._overlay_font = None
+        self._overlay_rect = None
+        if profile_path != None:
+            self._start_profiling()
 
     def run(self) -> None:
-        pygame.init()
+        #only the display (which also gives events) is started now, and fonts once there is text to show
+        pygame.display.init()
         self._resize_surface((_INITIAL_WIDTH,_INITIAL_HEIGHT))
 
-        tick = 0
-        frame = 0
+        self._driver.start()
 
         while self._running:
-            
-            new_tick = pygame.time.get_ticks()
-            if new_tick != tick:
-                tick = new_tick
-                frame += 1
-
-            #faller will fall every at 1 fps while the game is at 10 fps
-            if frame % 10 == 0:
-                self._idle_move()
+            #sleeps until there is input or the faller is due to fall, whichever comes first
             self._handle_event()
-            self._redraw()
-
-            while self._game_over == True:
-                self._print_text()
-                pygame.display.flip()
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        self._running = False
-                        return
+            if self._paused == True:
+                self._wait_idle('PAUSED')
+                continue
+            self._driver.fall_when_due()
+            if (self._game.get_generation(), self._game.get_faller_status()) != self._drawn_state \
+            or pygame.display.get_surface().get_size() != self._surface_size:
+                self._redraw()
+
+            if self._driver.game_over == True:
+                self._wait_idle('GAME OVER')
             
+        self._driver.close()
+        if self._profiler != None:
+            self._profiler.uninstrument()
+            if self._profile_path != None:
+                self._profiler.dump(self._profile_path)
         pygame.quit()
-    
+
+    def _wait_idle(self, text: str) -> None:
+        '''
+        Shows the text and sleeps until the next event, only drawing again if the window was resized or uncovered
+        Returns when the user unpauses (for the pause screen) or closes the window
+        '''
+        drawn = False
+        while self._running:
+            if drawn == False:
+                self._print_text(text)
+                pygame.display.flip()
+                drawn = True
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                self._running = False
+            elif event.type == pygame.VIDEORESIZE or event.type == pygame.VIDEOEXPOSE:
+                drawn = False
+            elif self._paused == True and event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                self._paused = False
+                #the faller picks up where it left off, and the board is drawn again from scratch
+                self._driver.resume()
+                self._surface_size = None
+                return
+
     def _redraw(self) -> None:
-        '''Displays the new frame for the game with the board and its contents'''
+        '''
+        Displays the new frame for the game with the board and its contents
+        Only the spots that changed since the last frame are drawn and sent to the display, unless the window
+        was resized, in which case everything is drawn again
+        The game's delta says which spots changed, so the rest of the board isn't looked at
+        '''
         surface = pygame.display.get_surface()
+        before, after, cells, popped, faller = self._game.take_delta()
+
+        if surface.get_size() != self._surface_size:
+            self._surface_size = surface.get_size()
+            self._sprites = {}
+            self._drawn = {}
+            self._stale = set()
+            surface.fill(_BACKGROUND_COLOR)
+            self._draw_rect()
+            self._overlay_rect = None
+            self._draw_jewels([(row, col) for row in range(3, _ROWS+3) for col in range(_COLUMNS)])
+            if self._overlay == True:
+                self._draw_overlay()
+            self._show()
+        else:
+            rects = self._clear_overlay()
+            #the faller's spots look different once it lands or freezes, even if its jewels didn't move
+            spots = {(row, col) for row, col, jewel in cells}.union(self._faller_spots, self._stale)
+            self._stale = set()
+            rects += self._draw_jewels(spots)
+            if self._overlay == True:
+                rects.append(self._draw_overlay())
+            if rects != []:
+                self._show(rects)
+        self._drawn_state = (self._game.get_generation(), self._game.get_faller_status())
+        if self._overlay == True or self._profile_path != None:
+            self._profiler.end_frame()
+
+    def _show(self, rects: list[pygame.Rect] = None) -> None:
+        '''Sends the given parts of the window to the display, or the whole window if no parts are given'''
+        if rects == None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
 
-        surface.fill(_BACKGROUND_COLOR)
-        self._draw_rect()
-        self._draw_jewels()
-        
-        pygame.display.flip()
-        self._clock.tick(10)
+    def _toggle_overlay(self) -> None:
+        '''
+        Shows or hides the profiling overlay
+        While it shows, the engine and the frontend are switched to timed versions of their classes,
+        and hiding it switches them back so nothing is timed (unless the frames are being saved to a file)
+        '''
+        self._overlay = not self._overlay
+        if self._profile_path == None:
+            if self._overlay == True:
+                self._start_profiling()
+            else:
+                self._profiler.uninstrument()
+        self._drawn_state = None
+
+    def _start_profiling(self) -> None:
+        '''Switches the engine and the frontend to timed versions of their classes, making the profiler the first time'''
+        if self._profiler == None:
+            self._profiler = columns_profile.Profiler()
+        self._profiler.instrument(self._game, columns_profile.ENGINE_STAGES)
+        self._profiler.instrument(self, _FRONTEND_STAGES)
+
+    def _draw_overlay(self) -> pygame.Rect:
+        '''Draws the timings of the last frame and the average of the recent frames in the top left corner'''
+        surface = pygame.display.get_surface()
+        if self._overlay_font == None:
+            self._overlay_font = _make_font('monospace', 12)
+        lines = [f'{"stage":16}{"calls":>6}{"ms":>8}{"avg ms":>8}']
+        for stage, calls, last, average in self._profiler.summary():
+            lines.append(f'{stage:16}{calls:6}{last:8.3f}{average:8.3f}')
+        images = [self._overlay_font.render(line, True, _COLORS['S']) for line in lines]
+        line_height = self._overlay_font.get_linesize()
+        self._overlay_rect = pygame.Rect(0, 0, max(image.get_width() for image in images)+8, line_height*len(images)+8)
+        surface.fill(_BACKGROUND_COLOR, self._overlay_rect)
+        for i in range(len(images)):
+            surface.blit(images[i], (4, 4 + i*line_height))
+        return self._overlay_rect
+
+    def _clear_overlay(self) -> list[pygame.Rect]:
+        '''
+        Paints over the last overlay and forgets what was drawn in the board spots under it, so they are drawn again
+        Returns the part of the window that was painted over
+        '''
+        if self._overlay_rect == None:
+            return []
+        surface = pygame.display.get_surface()
+        rect = self._overlay_rect
+        surface.fill(_BACKGROUND_COLOR, rect)
+        board = pygame.Rect(round(self._board_left), round(self._board_top), round(self._board_width), round(self._board_height))
+        surface.fill(_BOARD_COLOR, rect.clip(board))
+        for spot in list(self._drawn):
+            if self._box_rect(spot).colliderect(rect):
+                del self._drawn[spot]
+                self._stale.add(spot)
+        self._overlay_rect = None
+        return [rect]
     
-    def _print_text(self) -> None:
-        '''Displays the Game Over text when the user loses'''
+    def _print_text(self, text: str) -> None:
+        '''Displays the text (Game Over when the user loses, or Paused) in the middle of the window
+        The font is only made once, and the picture of the text is kept until the window changes size'''
         surface = pygame.display.get_surface()
         width, height = surface.get_size()
 
-        font = pygame.font.SysFont('Arial', 30)
-        surface.fill(pygame.Color(255,255,255))
-        img = font.render('GAME OVER', True, (0,0,0))
+        if self._font == None:
+            self._font = _make_font('Arial', 30)
+        key = (text, width, height)
+        img = self._texts.get(key)
+        if img == None:
+            self._texts = {}
+            img = self._texts[key] = self._font.render(text, True, columns_config.TEXT_COLOR)
+        surface.fill(columns_config.TEXT_BACKGROUND_COLOR)
         
         text_w = img.get_width()
         text_h = img.get_height()
 
         surface.blit(img,(width/2 - text_w/2, height/2 - text_h/2))
     
-    def _make_faller(self) -> None:
-        '''Randomly selects colors to create a faller'''
-        color_options = ('S','W','T','X','Y','Z')
-        column = list(range(6))
-        for i in column:
-            if self._state[3][i] != ' ':
-                column.remove(i)
-        column_num = random.choice(column)+1
-        self._game.create_faller(f'F {column_num} {color_options[random.randrange(6)]} {color_options[random.randrange(6)]} {color_options[random.randrange(6)]}')
-
     def _resize_surface(self, size: tuple[int, int]) -> None:
         '''Makes the window resizable for the user'''
         pygame.display.set_mode(size, pygame.RESIZABLE)
@@ -104,154 +235,155 @@ class ColumnsGame:
         Makes sure the entire board fits on the screen no matter the window size'''
         surface = pygame.display.get_surface()
         width, height = surface.get_size()
-        if width/height > 6/13:
+        if width/height > _COLUMNS/_ROWS:
             tl_x = 0.5*width-(self.rect_width(height)/2)
             pygame.draw.rect(surface,_BOARD_COLOR,(tl_x,0, self.rect_width(height),height))
             self._board_height = height
             self._board_width = self.rect_width(height)
+            self._board_left, self._board_top = tl_x, 0
             
         else:
             tl_y = 0.5*height - (self.rect_height(width)/2)
             pygame.draw.rect(surface, _BOARD_COLOR, (0, tl_y, width, self.rect_height(width)))
             self._board_width = width
             self._board_height = self.rect_height(width)
+            self._board_left, self._board_top = 0, tl_y
 
     def rect_height(self, width: float) -> float:
         '''
         Returns the proportional height of the board's rectangle based on the width of the window
-        Only called if ratio (width/height) is less than or equal to 6/13
+        Only called if ratio (width/height) is less than or equal to COLUMNS/ROWS
         '''
-        height = width/6
-        height *= 13
+        height = width/_COLUMNS
+        height *= _ROWS
         return height
         
     def rect_width(self, height: float) -> float:
         '''Returns the proportional width of the board's rectangle based on the height of the window
-        Only called if ratio (width/height) is greater than 6/13'''
-        width = height/13
-        width *= 6
+        Only called if ratio (width/height) is greater than COLUMNS/ROWS'''
+        width = height/_ROWS
+        width *= _COLUMNS
         return width
 
     def _handle_event(self) -> None:
         '''Reads whether the user exited out of the window, pressed the right/left arrow, or clicked space
-        Will exit the game, move the faller right/left, or rotate the jewels respectively'''
-        try:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self._running = False
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_SPACE:
-                        self._game.rotate_faller()
-                    elif event.key == pygame.K_RIGHT:
-                        self._game.move_faller_right()
-                    elif event.key == pygame.K_LEFT:
-                        self._game.move_faller_left()
-        except columns_mechanics.GameOverError:
-            self._game_over = True
-                
-    def _idle_move(self) -> None:
-        '''If there is no user input, the move would be an idle move and will make the faller fall (whichever one comes first)'''
-        self._game.faller_down()
-        if self._game.get_faller_status() == 'frozen' or self._game.get_faller_status() == None:
-            self._game_over = self._game.check_for_game_over()
-            if self._game_over == False:
-                self._make_faller()
-            else:
-                return
+        Will exit the game, move the faller right/left, or rotate the jewels respectively, and P pauses the game
+        Waits for the first event until the faller is next due to fall, then handles everything else waiting'''
+        timeout = self._driver.time_to_fall()
+        #a timeout of 0 would make pygame wait forever, so a faller that is already due doesn't wait at all
+        events = ([pygame.event.wait(timeout)] if timeout > 0 else []) + pygame.event.get()
+        self._apply_events(events)
+
+    def _apply_events(self, events: list[pygame.event.Event]) -> None:
+        '''
+        Handles the events _handle_event waited for, kept apart so the time spent waiting isn't profiled
+        Once P pauses the game, the moves after it in the same batch are dropped, unless another P unpauses it
+        '''
+        for event in events:
+            if event.type == pygame.QUIT:
+                self._running = False
+            elif event.type == pygame.VIDEOEXPOSE:
+                #the window has to be drawn again from scratch
+                self._surface_size = None
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_p:
+                    if self._paused == True:
+                        self._paused = False
+                        self._driver.resume()
+                    else:
+                        self._paused = True
+                        self._driver.pause()
+                elif self._paused == True:
+                    continue
+                elif event.key == pygame.K_F3:
+                    self._toggle_overlay()
+                elif event.key == pygame.K_SPACE:
+                    self._driver.move('R')
+                elif event.key == pygame.K_RIGHT:
+                    self._driver.move('>')
+                elif event.key == pygame.K_LEFT:
+                    self._driver.move('<')
         
-    def _color(self, color: str) -> pygame.Color:
+    def _color(self, color: str) -> tuple[int, int, int]:
         '''Depending on the letter on the board, it corresponds to the color that the jewel should
         be when drawn in the pygame window'''
-        if color == 'S':
-            return _S_COLOR
-        if color == 'W':
-            return _W_COLOR
-        if color == 'T':
-            return _T_COLOR
-        if color == 'X':
-            return _X_COLOR
-        if color == 'Y':
-            return _Y_COLOR
-        if color == 'Z':
-            return _Z_COLOR
-
-    def _draw_jewel(self, coords: tuple[int,int], color: str) -> None:
+        return _COLORS.get(color)
+
+    def _box_rect(self, coords: tuple[int,int]) -> pygame.Rect:
+        '''Returns the part of the window covered by a spot on the board'''
+        pixels_per_box = self._board_height/_ROWS
+        left = round(self._board_left + pixels_per_box*coords[1])
+        top = round(self._board_top + pixels_per_box*(coords[0]-3))
+        right = round(self._board_left + pixels_per_box*(coords[1]+1))
+        bottom = round(self._board_top + pixels_per_box*(coords[0]-2))
+        return pygame.Rect(left, top, right-left, bottom-top)
+
+    def _sprite(self, color: str, faller_type: str) -> pygame.Surface:
         '''
-        Depending on the coordinate of the jewel on the board, draws the jewel exactly in the center of
-        that spot on the pygame window
-        Also prints if the faller becomes frozen
+        Returns the picture of a jewel, drawing it the first time it is needed for this box size
+        A faller jewel has a circle in the middle, and a landed faller jewel has a smaller one
+        '''
+        size = int(self._board_height/_ROWS)+1
+        key = (color, faller_type, size)
+        sprite = self._sprites.get(key)
+        if sprite == None:
+            sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+            center = (size/2, size/2)
+            pixels_per_box = self._board_height/_ROWS
+            pygame.draw.circle(sprite, self._color(color), center, pixels_per_box/2)
+            if faller_type == 'falling':
+                pygame.draw.circle(sprite, _BOARD_COLOR, center, pixels_per_box/4)
+            elif faller_type == 'landed':
+                pygame.draw.circle(sprite, _BOARD_COLOR, center, pixels_per_box/8)
+            self._sprites[key] = sprite
+        return sprite
+
+    def _draw_jewels(self, spots) -> list[pygame.Rect]:
+        '''
+        Decides whether to draw a faller jewel or a normal jewel in each of the given spots on the board
+        Only spots that look different from the last time they were drawn are drawn again
+        Returns the parts of the window that were drawn on
         '''
-        
-        surface = pygame.display.get_surface()
-
-        y_coord = coords[0]-2
-        x_coord = coords[1]+1
-
-        pixels_per_box = self._board_height/13
-
-        self._center_y = pixels_per_box*y_coord - pixels_per_box/2
-        self._center_x = (surface.get_size()[0]/2 - self._board_width/2) + (pixels_per_box*x_coord - pixels_per_box/2)
-        pygame.draw.circle(surface, self._color(color), (self._center_x,self._center_y), self._board_width/6/2)
-
-    def _draw_faller(self, coords: tuple[int,int], color: str) -> None:
-        '''If the coordinate on the board is that of a faller jewel, the jewel will be
-        printed differently with another circle in the middle'''
-
-        surface = pygame.display.get_surface()
-
-        y_coord = coords[0]-2
-        x_coord = coords[1]+1
-
-        pixels_per_box = self._board_height/13
-
-        self._center_y = pixels_per_box*y_coord - pixels_per_box/2
-        self._center_x = (surface.get_size()[0]/2 - self._board_width/2) + (pixels_per_box*x_coord - pixels_per_box/2)
-        pygame.draw.circle(surface, self._color(color), (self._center_x,self._center_y), self._board_width/6/2)
-        pygame.draw.circle(surface, _BOARD_COLOR, (self._center_x,self._center_y), self._board_width/6/4)
-
-    def _draw_landed_faller(self, coords:tuple[int,int], color:str) -> None:
-        '''If the coordinate on the board is that of a faller jewel and the state of the faller jewel
-        was landed, the jewel will be printed differently with a smaller circle in the middle than the usual faller jewel'''
-
         surface = pygame.display.get_surface()
-
-        y_coord = coords[0]-2
-        x_coord = coords[1]+1
-
-        pixels_per_box = self._board_height/13
-
-        self._center_y = pixels_per_box*y_coord - pixels_per_box/2
-        self._center_x = (surface.get_size()[0]/2 - self._board_width/2) + (pixels_per_box*x_coord - pixels_per_box/2)
-        pygame.draw.circle(surface, self._color(color), (self._center_x,self._center_y), self._board_width/6/2)
-        pygame.draw.circle(surface, _BOARD_COLOR, (self._center_x,self._center_y), self._board_width/6/8)
-
-
-    def _draw_jewels(self) -> None:
-        '''Decides whether to draw a faller jewel or a normal jewel on the board'''
-        for row in range(3, len(self._state)):
-            curr_row = self._state[row]
-            for val in range(len(curr_row)):
-                #if the value matches the coordinates of any of the faller jewels
-                if (row == self._game.get_bot_coords()[0] and val == self._game.get_bot_coords()[1] and self._game.get_faller_status() != 'frozen' and self._game.get_faller_status() != None)\
-                or (row == self._game.get_mid_coords()[0] and val == self._game.get_mid_coords()[1] and self._game.get_faller_status() != 'frozen' and self._game.get_faller_status() != None)\
-                or (row == self._game.get_top_coords()[0] and val == self._game.get_top_coords()[1] and self._game.get_faller_status() != 'frozen' and self._game.get_faller_status() != None):
-                    if self._game.get_faller_status() == 'landed':
-                        self._draw_landed_faller((row, val), curr_row[val])
-                    else:
-                        self._draw_faller((row,val), curr_row[val])
-
-                #if the value is not a faller jewel
-                elif self._game.get_faller_status() == 'frozen' or self._game.get_faller_status() == None:
-                    if curr_row[val] != ' ':
-                        self._draw_jewel((row, val), curr_row[val])
-                    self._game_over = self._game.check_for_game_over()
-                
-                #catches any other circumstance of a jewel
-                else:
-                    if self._state[row][val] != ' ':
-                        self._draw_jewel((row, val), curr_row[val])
+        status = self._game.get_faller_status()
+        faller_coords = ()
+        if status != 'frozen' and status != None:
+            faller_coords = (self._game.get_bot_coords(), self._game.get_mid_coords(), self._game.get_top_coords())
+        self._faller_spots = faller_coords
+
+        rects = []
+        for row, val in spots:
+            if row < 3:
+                continue
+            jewel = self._game.get_jewel(row, val)
+            #a faller jewel is drawn differently from a normal jewel
+            look = (jewel, status if (row, val) in faller_coords else None)
+            if self._drawn.get((row, val)) != look:
+                self._drawn[(row, val)] = look
+                rect = self._box_rect((row, val))
+                surface.fill(_BOARD_COLOR, rect)
+                if jewel != ' ':
+                    #kept inside the spot so it never draws over a neighbor that isn't being redrawn
+                    sprite = self._sprite(look[0], look[1])
+                    surface.set_clip(rect)
+                    surface.blit(sprite, sprite.get_rect(center=rect.center))
+                    surface.set_clip(None)
+                rects.append(rect)
+        return rects
+
+def _make_font(name: str, size: int) -> pygame.font.Font:
+    '''Returns a system font, starting pygame's font module the first time one is needed'''
+    if pygame.font.get_init() == False:
+        pygame.font.init()
+    return pygame.font.SysFont(name, size)
 
 if __name__ == '__main__':
-    ColumnsGame().run()
+    parser = argparse.ArgumentParser(description='Plays Columns in a window; P pauses and F3 shows the profiling overlay')
+    parser.add_argument('record', nargs='?', default=None, help='records the game to this replay file')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--interval', type=int, default=_FALL_INTERVAL, help='milliseconds between each step the faller falls')
+    parser.add_argument('--profile', default=None, help='writes the profiled frames to this JSON (or .csv) file on exit')
+    args = parser.parse_args()
+    ColumnsGame(seed=args.seed, fall_interval=args.interval, record_path=args.record, profile_path=args.profile).run()
 
 
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import columns_mechanics
+
+async def play_client(host: str, port: int, path: str, rng: random.Random, move_chance: float, stats: dict,
+                      stop: float) -> None:
+    '''
+    Plays games on the server until the stop time, starting a new game whenever one ends
+    Makes a faller whenever there is none and sometimes moves or rotates it, and records the time between updates
+    '''
+    while time.perf_counter() < stop:
+        try:
+            if path != None:
+                connecting = asyncio.open_unix_connection(path)
+            else:
+                connecting = asyncio.open_connection(host, port)
+            reader, writer = await asyncio.wait_for(connecting, max(0.001, stop - time.perf_counter()))
+        except (OSError, asyncio.TimeoutError):
+            stats['failed'] += 1
+            continue
+        stats['connections'] += 1
+        last = None
+        cols = None
+        try:
+            while time.perf_counter() < stop:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), max(0.001, stop - time.perf_counter()))
+                except asyncio.TimeoutError:
+                    break
+                if line == b'' or line.startswith(b'GAME OVER'):
+                    stats['games'] += 1
+                    break
+                if not line.startswith(b'B '):
+                    stats['errors'] += 1
+                    continue
+                now = time.perf_counter()
+                if last != None:
+                    stats['gaps'].append(now - last)
+                last = now
+                stats['updates'] += 1
+
+                tick, status, popped, board = line[2:-1].split(b' ', 3)
+                if cols == None:
+                    cols = len(board) // stats['rows']
+                if status == b'-':
+                    jewels = ' '.join(rng.choice(columns_mechanics.JEWEL_COLORS) for i in range(3))
+                    writer.write(f'F {rng.randrange(cols)+1} {jewels}\n'.encode('ascii'))
+                elif rng.random() < move_chance:
+                    writer.write(rng.choice((b'<\n', b'>\n', b'R\n')))
+        finally:
+            writer.close()
+
+async def run_load(clients: int, seconds: float, host: str, port: int, path: str, rows: int, seed: int,
+                   move_chance: float) -> dict:
+    '''Runs the given number of clients at once for the given time and returns what they saw'''
+    stats = {'rows': rows, 'connections': 0, 'failed': 0, 'games': 0, 'updates': 0, 'errors': 0, 'gaps': []}
+    stop = time.perf_counter() + seconds
+    rng = random.Random(seed)
+    await asyncio.gather(*(play_client(host, port, path, random.Random(rng.random()), move_chance, stats, stop)
+                           for i in range(clients)))
+    return stats
+
+def summarize(stats: dict, seconds: float, interval: float) -> dict:
+    '''Turns the gaps between updates into how far off the tick interval they were, in milliseconds'''
+    jitter = sorted(abs(gap - interval)*1000 for gap in stats['gaps'])
+    result = {key: stats[key] for key in ('connections', 'failed', 'games', 'updates', 'errors')}
+    result['updates_per_sec'] = stats['updates']/seconds
+    if jitter != []:
+        result['jitter_p50_ms'] = jitter[len(jitter)//2]
+        result['jitter_p99_ms'] = jitter[min(len(jitter)-1, int(0.99*len(jitter)))]
+        result['jitter_max_ms'] = jitter[-1]
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Connects many clients to columns_server and reports how steady its ticks are')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--unix', default=None, help='connects to this unix socket path instead of TCP')
+    parser.add_argument('--rows', type=int, default=13, help='rows of the server\'s boards')
+    parser.add_argument('--interval', type=float, default=1.0, help='the server\'s tick interval in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--move-chance', type=float, default=0.5, help='chance of a move after each update')
+    args = parser.parse_args()
+    stats = asyncio.run(run_load(args.clients, args.seconds, args.host, args.port, args.unix, args.rows, args.seed,
+                                 args.move_chance))
+    print(json.dumps(summarize(stats, args.seconds, args.interval)))
+
+if __name__ == '__main__':
+    main()
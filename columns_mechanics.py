@@ -1,4 +1,30 @@
-import sys
+import collections
+import random
+import struct
+
+#numpy is only imported once a game asks for an array board, so importing the engine doesn't wait for it
+numpy = None
+
+#spots on the board hold the character code of the jewel's letter, and empty spots hold the code of a space
+_EMPTY_CODE = ord(' ')
+
+JEWEL_COLORS = ('S','W','T','X','Y','Z')
+
+#faller status stored as one byte by save_state
+_STATUS_CODES = {None: 0, 'falling': 1, 'landed': 2, 'frozen': 3}
+_STATUS_NAMES = {code: status for status, code in _STATUS_CODES.items()}
+#faller column and rows (-1 for none), faller jewels, faller status, jewels popped so far, score and chain;
+#the column and rows are 16 bits so boards past 127 rows or columns can be saved
+_STATE_FORMAT = struct.Struct('<hhhh3sBIIH')
+
+#names of the directions a match group can go in, by the number used inside the engine
+DIRECTIONS = ('horizontal', 'vertical', 'diagonal_down', 'diagonal_up')
+
+#the spots of every line on the user's board for each direction, by board size, made the first time a size is used
+_LINES = {}
+
+#random number for each (row, col, jewel), made the first time it is needed
+_ZOBRIST_KEYS = {}
 
 class InvalidMoveError(Exception):
     '''Raised when user tries to make a faller in an invalid column'''
@@ -9,12 +35,49 @@ class GameOverError(Exception):
     pass
 
 class ColumnsGame():
-    def __init__(self, r: int, c: int):
+    '''
+    Keeps each row of the board as a bytearray of jewel codes, and only uses letters for what goes in and out:
+    get_board gives back the letters, and fallers are made from letters
+    The methods that change the game return None; get_board (or get_jewel) reads the board when it is needed
+    '''
+    __slots__ = ('_r', '_c', '_begin_board', '_board', '_use_array', '_array', '_dirty', '_matched_coords', '_moved_coords',
+                 '_popped', '_score', '_chain', '_match_groups', '_generation', '_stable_key', '_stable', '_game_over_key', '_game_over', '_hash',
+                 '_top_jewel', '_mid_jewel', '_bot_jewel', '_faller_x', '_top_y', '_mid_y', '_bot_y', '_faller_col',
+                 '_faller_type', '_column_tops', '_shared_rows', '_undo', '_changes', '_changed_all',
+                 '_popped_spots', '_delta_generation')
+
+    def __init__(self, r: int, c: int, use_array: bool = False):
         self._r = r
         self._c = c
 
         self._begin_board = []
         self._board = []
+
+        #optional copy of the board as a 2D array of color codes, used to find matches faster
+        if use_array:
+            _import_numpy()
+        self._use_array = use_array
+        self._array = None
+
+        #spots that changed since matching last ran, and the spots it found matches in
+        self._dirty = set()
+        self._matched_coords = []
+        self._moved_coords = []
+        self._popped = 0
+        #points scored so far, and how many rounds have popped since the last faller was made
+        self._score = 0
+        self._chain = 0
+        #(jewel code, direction, spots) of each line of matching jewels, or None if only the spots are known
+        self._match_groups = []
+
+        #goes up on every change to the board so the answers to is_stable and check_for_game_over can be kept
+        self._generation = 0
+        self._stable_key = None
+        self._stable = None
+        self._game_over_key = None
+        self._game_over = None
+        #zobrist hash of the board, changed a spot at a time along with the board
+        self._hash = 0
         
         self._top_jewel = None
         self._mid_jewel = None
@@ -28,11 +91,35 @@ class ColumnsGame():
         self._faller_col = None
         self._faller_type = None
 
+        #row of the highest jewel that isn't part of a moving faller in each column
+        self._column_tops = [r+3]*c
+
+        #rows shared with a snapshot or a clone, copied before they are changed
+        self._shared_rows = set()
+        #the oldest saves are dropped past the limit
+        self._undo = collections.deque(maxlen=100)
+
+        #spots changed and spots popped since the last take_delta, or None until take_delta is first called
+        #(or after stop_deltas), and whether the whole board was replaced since then
+        self._changes = None
+        self._changed_all = False
+        self._popped_spots = None
+        self._delta_generation = 0
+
     def get_bot_coords(self) -> tuple:
         return (self._bot_y,self._faller_x)
     
     def get_board(self) -> list[list[str]]:
-        return self._board
+        '''Returns a copy of the board as a list of list of strings, with a space for each empty spot'''
+        return [list(row.decode('ascii')) for row in self._board]
+
+    def get_board_bytes(self) -> bytes:
+        '''Returns the board as bytes, one jewel letter (or a space) for each spot, row after row'''
+        return b''.join(self._board)
+
+    def get_jewel(self, row: int, col: int) -> str:
+        '''Returns the jewel in one spot of the board, or a space if it is empty'''
+        return chr(self._board[row][col])
     
     def get_mid_coords(self) -> tuple:
         return (self._mid_y,self._faller_x)
@@ -40,22 +127,19 @@ class ColumnsGame():
     def get_top_coords(self) -> tuple:
         return (self._top_y,self._faller_x)
 
-    def create_board(self, command: str) -> list[list[str]]:
-        '''Given the command to either make an empty or pre determined board, either returns an empty 
-        list of list of ' ', or returns a list of lists of strings based on the pattern of the values given'''
+    def create_board(self, command: str) -> None:
+        '''Given the command to either make an empty or pre determined board, either makes an empty
+        board, or makes a board based on the pattern of the values given'''
 
         if self._c >= 3 and self._r >= 4:
             if command == 'EMPTY':
                 for i in range(self._r+3):
-                    curr_row = []
-                    for j in range(self._c):
-                        curr_row.append(' ')
-                    self._board.append(curr_row)
+                    self._board.append(bytearray(b' '*self._c))
             elif command == 'CONTENTS':
-                self._board = self._begin_board
+                self._board = [bytearray(''.join(row).encode('ascii')) for row in self._begin_board]
+            self._sync_array()
             self.gravity()
             self.matching()
-            return self._board
         else:
             raise ValueError
         
@@ -75,94 +159,96 @@ class ColumnsGame():
         return self._begin_board
         
     
-    def faller_down(self) -> list[list[str]]:
+    def faller_down(self) -> None:
         '''
         Checks if there is a value under the jewel, and if there is, the jewel moves down
-        Goes from the bottom row to the top to make sure any jewels falling affects the jewel above it
+        Only looks at the spot under the bottom faller jewel, using the top of the stack in the faller's column
         Changes the faller type to either landed or frozen depending on whether a jewel was already under it or not
-        If the jewel isn't a faller, will automatically go all the way down
         '''
-        for row in range(len(self._board)-1,-1,-1):
-            for col in range(self._c):
-                jewel = self._board[row][col]
-                if row == self._bot_y and col == self._faller_x:
-                    #if there is something under the faller
-                    if self._bot_y == len(self._board)-1:
-                        if self._faller_type == 'landed':
-                            self._faller_type = 'frozen'
-                        elif self._faller_type == 'frozen':
-                            self._reset_faller()
-                        else:
-                            self._faller_type = 'landed'
-                    elif self._board[self._bot_y+1][col] != ' ':
-                        if self._faller_type == 'landed':
-                            self._faller_type = 'frozen'
-                        elif self._faller_type == 'frozen':
-                            self._reset_faller()
-                        else:
-                            self._faller_type = 'landed'
-                    #if space under is empty
-                    else:
-                        self._board[row+1][col] = jewel
-                        self._board[row][col] = self._mid_jewel
-                        self._board[row-1][col] = self._top_jewel
-                        self._board[row-2][col] = ' '
-                        self._bot_y, self._mid_y, self._top_y = self._bot_y+1, self._mid_y+1,self._top_y+1
-                        if self._bot_y == len(self._board)-1:
-                            self._faller_type = 'landed'
-                        elif self._board[self._bot_y+1][col] != ' ':
-                            self._faller_type = 'landed'
-        return self._board
+        if self._bot_y == None or self._faller_x == None:
+            return
+        row, col = self._bot_y, self._faller_x
+        #if there is something under the faller (or it is on the bottom row)
+        if row+1 >= self._column_tops[col]:
+            if self._faller_type == 'landed':
+                self._faller_type = 'frozen'
+                self._column_tops[col] = self._top_y
+            elif self._faller_type == 'frozen':
+                self._reset_faller()
+            else:
+                self._faller_type = 'landed'
+        #if space under is empty
+        else:
+            self._set_cell(row+1, col, self._board[row][col])
+            self._set_cell(row, col, self._mid_jewel)
+            self._set_cell(row-1, col, self._top_jewel)
+            self._set_cell(row-2, col, _EMPTY_CODE)
+            self._bot_y, self._mid_y, self._top_y = self._bot_y+1, self._mid_y+1,self._top_y+1
+            if self._bot_y+1 >= self._column_tops[col]:
+                self._faller_type = 'landed'
     
-    def gravity(self) -> list[list[str]]:
-        '''All the non-faller jewels will automatically go as far down as they can before landing on another jewel'''
+    def gravity(self) -> None:
+        '''
+        All the non-faller jewels will automatically go as far down as they can before landing on another jewel
+        Each column is packed down in one pass, and the jewels that moved are recorded as (old spot, new spot)
+        '''
+        self._moved_coords = []
         if self._faller_type == None or self._faller_type == 'frozen':
-            while True:
-                no_empty_under = True
-                for row in range(len(self._board)-2,-1,-1):
-                    for col in range(self._c):
-                        curr_val = self._board[row][col]
-                        if curr_val != ' ':
-                            if self._board[row+1][col] == ' ':
-                                self._board[row+1][col] = curr_val
-                                self._board[row][col] = ' '
-                                no_empty_under = False
-                if no_empty_under == True:
-                    return self._board
+            for col in range(self._c):
+                #lowest spot in the column that hasn't been filled yet
+                lowest_empty = len(self._board)-1
+                for row in range(len(self._board)-1,-1,-1):
+                    curr_val = self._board[row][col]
+                    if curr_val != _EMPTY_CODE:
+                        if row != lowest_empty:
+                            self._set_cell(lowest_empty, col, curr_val)
+                            self._set_cell(row, col, _EMPTY_CODE)
+                            self._moved_coords.append(((row,col),(lowest_empty,col)))
+                        lowest_empty -= 1
+                self._column_tops[col] = lowest_empty+1
+
+    def get_moved(self) -> list[tuple]:
+        '''Returns the (old spot, new spot) of every jewel moved by the last call to gravity'''
+        return self._moved_coords
     
-    def create_faller(self, command: str) -> list[list[str]]:
+    def create_faller(self, command: str) -> None:
         '''Creates a faller on the top 3 rows of the board and assigns the location of each faller to an x and y value
         Assigns the faller type as falling automatically'''
+        command = command.split(' ')
+        self.create_faller_at(int(command[1])-1, command[2], command[3], command[4])
+
+    def create_faller_at(self, faller_col: int, top: str, mid: str, bot: str) -> None:
+        '''Does the same as create_faller, but is given the column (starting from 0) and the three jewels
+        instead of a command that has to be split up
+        A column that isn't on the board raises InvalidMoveError before anything about the game is changed'''
         if self.check_for_game_over() == False:
             if self._faller_type == None or self._faller_type == 'frozen':
-                self._faller_type = 'falling'
-                command = command.split(' ')
-                faller_col = int(command[1])-1
-                
-                if faller_col < self._c:
-                    self._faller_x = faller_col
-                    self._bot_y = 2
-                    self._mid_y = 1
-                    self._top_y = 0
-
-                    #bookmark the jewels
-                    self._bot_jewel = command[4]
-                    self._mid_jewel = command[3]
-                    self._top_jewel = command[2]
-
-                    #add jewels to proper column location
-                    self._board[self._bot_y][self._faller_x] = self._bot_jewel
-                    self._board[self._mid_y][self._faller_x] = self._mid_jewel
-                    self._board[self._top_y][self._faller_x] = self._top_jewel
-
-                    self.faller_down()
-                    return self._board
-                else:
+                if not 0 <= faller_col < self._c:
                     raise InvalidMoveError
+                jewels = (ord(top), ord(mid), ord(bot))
+
+                self._faller_type = 'falling'
+                #a new faller ends the chain
+                self._chain = 0
+
+                self._faller_x = faller_col
+                self._bot_y = 2
+                self._mid_y = 1
+                self._top_y = 0
+
+                #bookmark the jewels
+                self._top_jewel, self._mid_jewel, self._bot_jewel = jewels
+
+                #add jewels to proper column location
+                self._set_cell(self._bot_y, self._faller_x, self._bot_jewel)
+                self._set_cell(self._mid_y, self._faller_x, self._mid_jewel)
+                self._set_cell(self._top_y, self._faller_x, self._top_jewel)
+
+                self.faller_down()
         else:
             raise GameOverError
     
-    def move_faller_right(self) -> list[list[str]]:
+    def move_faller_right(self) -> None:
         '''
         If there are no jewels to the right of the bottom jewel, then the faller will move right
         If moving the faller right lands it right on top of a jewel, faller becomes landed status
@@ -171,26 +257,23 @@ class ColumnsGame():
             if self._faller_type != 'frozen' and self._faller_type != None:
                 if self.can_move('right') == True:
                     #fills previous pos with empty space;
-                    self._board[self._bot_y][self._faller_x] = ' '
-                    self._board[self._mid_y][self._faller_x] = ' '
-                    self._board[self._top_y][self._faller_x] = ' '
+                    self._set_cell(self._bot_y, self._faller_x, _EMPTY_CODE)
+                    self._set_cell(self._mid_y, self._faller_x, _EMPTY_CODE)
+                    self._set_cell(self._top_y, self._faller_x, _EMPTY_CODE)
 
                     #moves all jewels in faller to the right
                     self._faller_x += 1
-                    self._board[self._top_y][self._faller_x] = self._top_jewel
-                    self._board[self._mid_y][self._faller_x] = self._mid_jewel
-                    self._board[self._bot_y][self._faller_x] = self._bot_jewel
+                    self._set_cell(self._top_y, self._faller_x, self._top_jewel)
+                    self._set_cell(self._mid_y, self._faller_x, self._mid_jewel)
+                    self._set_cell(self._bot_y, self._faller_x, self._bot_jewel)
 
-                    if self._bot_y == self._r + 2:
-                        self._faller_type = 'landed'
-                    elif self._board[self._bot_y+1][self._faller_x] != ' ':
+                    if self._bot_y+1 >= self._column_tops[self._faller_x]:
                         self._faller_type = 'landed'
-            return self._board
         else:
             raise GameOverError
         
     
-    def move_faller_left(self) -> list[list[str]]:
+    def move_faller_left(self) -> None:
         '''
         If there are no jewels to the left of the bottom jewel, the faller will move left
         If moving the faller left lands it on top of a jewel, faller becomes landed status
@@ -199,42 +282,37 @@ class ColumnsGame():
             if self._faller_type != 'frozen' and self._faller_type != None:
                     if self.can_move('left') == True:
                         #fills previous pos with empty space;
-                        self._board[self._bot_y][self._faller_x] = ' '
-                        self._board[self._mid_y][self._faller_x] = ' '
-                        self._board[self._top_y][self._faller_x] = ' '
+                        self._set_cell(self._bot_y, self._faller_x, _EMPTY_CODE)
+                        self._set_cell(self._mid_y, self._faller_x, _EMPTY_CODE)
+                        self._set_cell(self._top_y, self._faller_x, _EMPTY_CODE)
 
                         #moves all jewels in faller to the right
                         self._faller_x -= 1
-                        self._board[self._top_y][self._faller_x] = self._top_jewel
-                        self._board[self._mid_y][self._faller_x] = self._mid_jewel
-                        self._board[self._bot_y][self._faller_x] = self._bot_jewel
-                    if self._bot_y == self._r + 2:
+                        self._set_cell(self._top_y, self._faller_x, self._top_jewel)
+                        self._set_cell(self._mid_y, self._faller_x, self._mid_jewel)
+                        self._set_cell(self._bot_y, self._faller_x, self._bot_jewel)
+                    if self._bot_y+1 >= self._column_tops[self._faller_x]:
                         self._faller_type = 'landed'
-                    elif self._board[self._bot_y+1][self._faller_x] != ' ':
-                        self._faller_type = 'landed'
-            return self._board
         else:
             raise GameOverError
     def can_move(self, direction: str) -> bool:
-        '''Checks if there are any jewels next to the bottom faller jewel'''
+        '''Checks if there are any jewels next to the bottom faller jewel, using the top of the stack in the next column'''
         if direction == 'right':
             if self._faller_x+1 < self._c:
-                if self._board[self._bot_y][self._faller_x+1] != ' ':
-                    return False
-                else:
-                    return True
+                return self._column_tops[self._faller_x+1] > self._bot_y
         if direction == 'left':
             if self._faller_x-1 >= 0:
-                if self._board[self._bot_y][self._faller_x-1] != ' ':
-                    return False
-                else:
-                    return True
+                return self._column_tops[self._faller_x-1] > self._bot_y
+
+    def get_open_columns(self) -> list[int]:
+        '''Returns the columns (starting from 0) that still have room for a new faller on the user's board'''
+        return [col for col in range(self._c) if self._column_tops[col] > 3]
     
     def get_faller_status(self) -> str:
         '''Returns whether the faller is falling, landed, or frozen'''
         return self._faller_type
     
-    def rotate_faller(self) -> list[list[str]]:
+    def rotate_faller(self) -> None:
         '''
         Moves the top and middle faller jewel to the middle and bottom faller jewel spot respectively
         Moves the bottom faller jewel to the top faller jewel position
@@ -242,90 +320,384 @@ class ColumnsGame():
         if self.check_for_game_over() == False:
             if self._faller_type != 'frozen' and self._faller_type != None:
                 bot, mid, top = self._bot_jewel, self._mid_jewel, self._top_jewel
-                self._board[self._bot_y][self._faller_x] = mid
-                self._board[self._mid_y][self._faller_x] = top
-                self._board[self._top_y][self._faller_x] = bot
+                self._set_cell(self._bot_y, self._faller_x, mid)
+                self._set_cell(self._mid_y, self._faller_x, top)
+                self._set_cell(self._top_y, self._faller_x, bot)
 
                 self._bot_jewel = mid
                 self._mid_jewel = top
                 self._top_jewel = bot 
                 
-            return self._board
         else:
             raise GameOverError
     
     def no_matches(self) -> bool:
-        '''Checks if there are no more matches to be made
-        Will always be used after matching functions'''
+        '''Checks if there are no more matches to be made, and pops the matched jewels if there are
+        Returns True if nothing was popped'''
         if self._faller_type == 'frozen' or self._faller_type == None:
-            board = self._board
-            self.matching()
-            self.pop()
-            if self._board == board:
+            if self.is_stable() == True:
                 return True
-            else:
-                return False
+            self.pop()
+            return False
 
-    def matching(self) -> list[list[str]]:
+    def is_stable(self) -> bool:
         '''
-        If three or more jewels match either vertically, horizontally, or diagonally, it will mark the coordinates of the jewel
+        Returns True if there is no faller moving and no jewels left to match
+        Does not change the board, and is only worked out again once the board or the faller changes
         '''
-        self._matched_coords = []
+        key = (self._generation, self._faller_type)
+        if self._stable_key != key:
+            stable = False
+            if self._faller_type == 'frozen' or self._faller_type == None:
+                self.matching()
+                stable = self._matched_coords == []
+            self._stable_key, self._stable = key, stable
+        return self._stable
+
+    def get_popped(self) -> int:
+        '''Returns how many jewels have been popped so far'''
+        return self._popped
+
+    def get_score(self) -> int:
+        '''Returns the points scored so far (see score_groups)'''
+        return self._score
+
+    def get_chain(self) -> int:
+        '''Returns how many rounds of pops there have been since the last faller was made'''
+        return self._chain
+
+    def resolve_chains(self) -> int:
+        '''
+        Pops every round of matches, letting the rest fall and matching again each time, until the board is stable
+        Only does anything once there is no faller; returns how many rounds were popped
+        '''
+        rounds = 0
+        if self._faller_type == None:
+            while self.is_stable() == False:
+                self.pop()
+                rounds += 1
+        return rounds
+
+    def tick(self) -> None:
+        '''
+        Moves the game forward one step of time: the faller moves down, lands, freezes and then goes away
+        Once there is no faller, one round of matches is popped per step
+        '''
+        self.faller_down()
+        if self._faller_type == None:
+            self.no_matches()
 
+    def save_state(self) -> bytes:
+        '''Packs the board (one byte per spot) and the faller into bytes that load_state can read back'''
+        faller = [-1 if value == None else value for value in (self._faller_x, self._top_y, self._mid_y, self._bot_y)]
+        jewels = bytes(0 if jewel == None else jewel for jewel in (self._top_jewel, self._mid_jewel, self._bot_jewel))
+        return b''.join(self._board) + _STATE_FORMAT.pack(*faller, jewels, _STATUS_CODES[self._faller_type], self._popped,
+                                                          self._score, self._chain)
+
+    def load_state(self, data: bytes) -> None:
+        '''Puts the game in the state packed by save_state'''
+        size = (self._r+3)*self._c
+        self._board[:] = [bytearray(data[row*self._c:(row+1)*self._c]) for row in range(self._r+3)]
+        self._sync_array()
+
+        faller_x, top_y, mid_y, bot_y, jewels, status, self._popped, self._score, self._chain = _STATE_FORMAT.unpack_from(data, size)
+        self._faller_x, self._top_y, self._mid_y, self._bot_y = [None if value == -1 else value for value in (faller_x, top_y, mid_y, bot_y)]
+        self._top_jewel, self._mid_jewel, self._bot_jewel = [None if jewel == 0 else jewel for jewel in jewels]
+        self._faller_type = _STATUS_NAMES[status]
+
+        #a moving faller isn't part of the stack in its column
+        for col in range(self._c):
+            row = 0
+            while row < len(self._board) and (self._board[row][col] == _EMPTY_CODE or
+                                              (col == self._faller_x and self._faller_type in ('falling', 'landed') and row <= self._bot_y)):
+                row += 1
+            self._column_tops[col] = row
+
+    def snapshot(self) -> tuple:
+        '''
+        Returns the state of the game so it can be put back later with restore
+        The rows of the board are shared with the snapshot instead of copied; whichever row the game
+        changes next is copied at that point
+        '''
+        self._shared_rows = set(range(len(self._board)))
+        return (tuple(self._board), None if self._array is None else self._array.copy(),
+                (self._top_jewel, self._mid_jewel, self._bot_jewel, self._faller_x, self._top_y, self._mid_y, self._bot_y,
+                 self._faller_col, self._faller_type),
+                tuple(self._column_tops), frozenset(self._dirty), tuple(self._matched_coords), tuple(self._moved_coords),
+                self._popped, self._score, self._chain,
+                None if self._match_groups == None else tuple(self._match_groups), self._hash)
+
+    def restore(self, snapshot: tuple) -> None:
+        '''Puts the game back to the state it was in when the snapshot was taken'''
+        rows, array, faller, column_tops, dirty, matched, moved, popped, score, chain, match_groups, board_hash = snapshot
+        self._board[:] = rows
+        self._shared_rows = set(range(len(rows)))
+        self._array = None if array is None else array.copy()
+        (self._top_jewel, self._mid_jewel, self._bot_jewel, self._faller_x, self._top_y, self._mid_y, self._bot_y,
+         self._faller_col, self._faller_type) = faller
+        self._column_tops = list(column_tops)
+        self._dirty = set(dirty)
+        self._matched_coords = list(matched)
+        self._moved_coords = list(moved)
+        self._popped = popped
+        self._score = score
+        self._chain = chain
+        self._match_groups = None if match_groups == None else list(match_groups)
+        self._hash = board_hash
+        #a new generation, since this board may not be the one the kept answers were worked out for
+        self._generation += 1
+        self._changed_all = True
+
+    def clone(self) -> 'ColumnsGame':
+        '''Returns a separate game in the same state, sharing the rows of the board until either game changes them'''
+        game = ColumnsGame(self._r, self._c)
+        game._use_array = self._use_array
+        game._undo = collections.deque(maxlen=self._undo.maxlen)
+        game.restore(self.snapshot())
+        return game
+
+    def push_undo(self) -> None:
+        '''Saves the current state so undo can go back to it; only the oldest saves past the limit are dropped'''
+        self._undo.append(self.snapshot())
+
+    def undo(self) -> bool:
+        '''Goes back to the last state saved with push_undo, returning False if there is nothing to go back to'''
+        if not self._undo:
+            return False
+        self.restore(self._undo.pop())
+        return True
+
+    def get_hash(self) -> int:
+        '''Returns a 64 bit hash of the jewels on the board, which is the same for any two equal boards'''
+        return self._hash
+
+    def get_generation(self) -> int:
+        '''Returns a number that goes up every time something on the board changes'''
+        return self._generation
+
+    def take_delta(self) -> tuple:
+        '''
+        Returns what changed since the last call as (generation then, generation now, cells, popped, faller):
+        cells is (row, col, jewel) for every spot written since then, with a space for an empty spot, popped is
+        the spots popped since then, and faller is (status, col, top row, jewels top to bottom) or None
+        A spot that was written and then put back is still in cells, so the delta is right for any state between
+        the two generations; the first call, and the first after the whole board is replaced, has every spot
+        '''
+        if self._changes == None or self._changed_all == True:
+            spots = [(row, col) for row in range(len(self._board)) for col in range(self._c)]
+        else:
+            spots = sorted(self._changes)
+        board = self._board
+        cells = [(row, col, chr(board[row][col])) for row, col in spots]
+        popped = [] if self._popped_spots == None else sorted(self._popped_spots)
+
+        faller = None
+        if self._faller_type != None:
+            faller = (self._faller_type, self._faller_x, self._top_y,
+                      chr(self._top_jewel) + chr(self._mid_jewel) + chr(self._bot_jewel))
+
+        delta = (self._delta_generation, self._generation, cells, popped, faller)
+        self._changes = set()
+        self._changed_all = False
+        self._popped_spots = []
+        self._delta_generation = self._generation
+        return delta
+
+    def stop_deltas(self) -> None:
+        '''Stops keeping the changes for take_delta once nothing reads them; the next take_delta has every spot'''
+        self._changes = None
+        self._changed_all = False
+        self._popped_spots = None
+
+    def matching(self) -> None:
+        '''
+        If three or more jewels match either vertically, horizontally, or diagonally, it will mark the coordinates of the jewel
+        Only the lines going through jewels that changed since the last check (or that were already matched) are looked at,
+        and each of those lines is read once from end to end, splitting it into runs of the same jewel
+        '''
         if self._faller_type == 'frozen' or self._faller_type == None:
-            for row in range(3,len(self._board)):
-                for col in range(self._c):
-                    if self._board[row][col] != ' ':
-                        #if 3+ match horizontally -> save coordinates
-                        if col+2 < self._c:
-                            if self._board[row][col] == self._board[row][col+1] == self._board[row][col+2]:
-                                self._matched_coords.append((row,col))
-                                self._matched_coords.append((row,col+1))
-                                self._matched_coords.append((row,col+2))
-                        #if 3+ match vertically -> save coordinates
-                        if row+2 < self._r+3:
-                            if self._board[row][col] == self._board[row+1][col] == self._board[row+2][col]:
-                                self._matched_coords.append((row,col))
-                                self._matched_coords.append((row+1,col))
-                                self._matched_coords.append((row+2,col))
-                        # if 3+ match diagonally downwards -> save coordinaes
-                        if row+2 < self._r+3 and col+2 < self._c:
-                            if self._board[row][col] == self._board[row+1][col+1] == self._board[row+2][col+2]:
-                                self._matched_coords.append((row,col))
-                                self._matched_coords.append((row+1,col+1))
-                                self._matched_coords.append((row+2,col+2))
-                        # if 3+ match diagonally upwards -> save coordinates
-                        if row-2 > 2 and col+2 < self._c:
-                            if self._board[row][col] == self._board[row-1][col+1] == self._board[row-2][col+2]:
-                                self._matched_coords.append((row,col))
-                                self._matched_coords.append((row-1,col+1))
-                                self._matched_coords.append((row-2,col+2))
-        
+            if self._array is not None and len(self._dirty) > self._c:
+                self._matched_coords = self._array_matching()
+                self._match_groups = None
+            else:
+                self._match_groups = self._scan_lines(self._dirty.union(self._matched_coords))
+                found = set()
+                for jewel, direction, spots in self._match_groups:
+                    found.update(spots)
+                self._matched_coords = list(found)
+            self._dirty = set()
+
         # self.pop()        
-        return self._board
+
+    def get_match_groups(self) -> list[tuple]:
+        '''
+        Returns (jewel, direction, length, spots) for each line of three or more matching jewels found by the last matching,
+        where direction is one of DIRECTIONS and spots are in order along the line
+        A run of more than three is one group, and a jewel in two lines (such as the corner of an L) is in both groups
+        '''
+        if self._match_groups == None:
+            self._match_groups = self._scan_lines(self._matched_coords)
+        return [(chr(jewel), DIRECTIONS[direction], len(spots), spots) for jewel, direction, spots in self._match_groups]
+
+    def _scan_lines(self, spots) -> list[tuple]:
+        '''
+        Returns (jewel code, direction, spots) for every run of three or more in the lines going through the given spots
+        Each line is only read from two spots before the first given spot on it to two spots after the last one,
+        stretched at both ends to take in the whole run of jewels there
+        '''
+        if not spots:
+            return []
+        lines = _LINES.get((self._r, self._c))
+        if lines == None:
+            lines = _LINES[(self._r, self._c)] = _board_lines(self._r, self._c)
+
+        #lowest and highest column (for rows) or row (for the other directions) of the given jewels on each line;
+        #empty spots can't be in a match, so the spots a faller left on its way down don't stretch the lines read
+        board = self._board
+        windows = {}
+        for row, col in spots:
+            if row >= 3 and board[row][col] != _EMPTY_CODE:
+                for key, place in (((0, row), col), ((1, col), row), ((2, col-row), row), ((3, col+row), row)):
+                    window = windows.get(key)
+                    if window == None:
+                        windows[key] = [place, place]
+                    elif place < window[0]:
+                        window[0] = place
+                    elif place > window[1]:
+                        window[1] = place
+
+        groups = []
+        for (direction, key), (low, high) in windows.items():
+            line = lines[direction].get(key)
+            if line == None:
+                continue
+            first = line[0][1] if direction == 0 else line[0][0]
+            start = max(0, low-first-2)
+            end = min(len(line), high-first+3)
+            row, col = line[start]
+            jewel = board[row][col]
+            while start > 0 and board[line[start-1][0]][line[start-1][1]] == jewel:
+                start -= 1
+            row, col = line[end-1]
+            jewel = board[row][col]
+            while end < len(line) and board[line[end][0]][line[end][1]] == jewel:
+                end += 1
+
+            run = start
+            previous = _EMPTY_CODE
+            for i in range(start, end):
+                row, col = line[i]
+                jewel = board[row][col]
+                if jewel != previous:
+                    if i-run >= 3 and previous != _EMPTY_CODE:
+                        groups.append((previous, direction, line[run:i]))
+                    run, previous = i, jewel
+            if end-run >= 3 and previous != _EMPTY_CODE:
+                groups.append((previous, direction, line[run:end]))
+        return groups
+
+    def _array_matching(self) -> list[tuple]:
+        '''
+        Finds the same matches as matching, but compares the whole array at once by lining up shifted slices of it
+        Returns the coordinates of every matched jewel once
+        '''
+        board = self._array[3:]
+        filled = board != _EMPTY_CODE
+        matched = numpy.zeros(board.shape, dtype=bool)
+
+        #horizontal
+        found = filled[:, :-2] & (board[:, :-2] == board[:, 1:-1]) & (board[:, 1:-1] == board[:, 2:])
+        matched[:, :-2] |= found
+        matched[:, 1:-1] |= found
+        matched[:, 2:] |= found
+        #vertical
+        found = filled[:-2] & (board[:-2] == board[1:-1]) & (board[1:-1] == board[2:])
+        matched[:-2] |= found
+        matched[1:-1] |= found
+        matched[2:] |= found
+        #diagonally downwards
+        found = filled[:-2, :-2] & (board[:-2, :-2] == board[1:-1, 1:-1]) & (board[1:-1, 1:-1] == board[2:, 2:])
+        matched[:-2, :-2] |= found
+        matched[1:-1, 1:-1] |= found
+        matched[2:, 2:] |= found
+        #diagonally upwards
+        found = filled[:-2, 2:] & (board[:-2, 2:] == board[1:-1, 1:-1]) & (board[1:-1, 1:-1] == board[2:, :-2])
+        matched[:-2, 2:] |= found
+        matched[1:-1, 1:-1] |= found
+        matched[2:, :-2] |= found
+
+        rows, cols = matched.nonzero()
+        return [(int(row)+3, int(col)) for row, col in zip(rows, cols)]
+
+    def _set_cell(self, row: int, col: int, jewel: int) -> None:
+        '''Puts the jewel code (or _EMPTY_CODE) in the given spot, keeping the array copy of the board and the hash up to date
+        A row shared with a snapshot or clone is copied first'''
+        if self._shared_rows and row in self._shared_rows:
+            self._board[row] = self._board[row][:]
+            self._shared_rows.discard(row)
+        self._hash ^= _zobrist_key(row, col, self._board[row][col]) ^ _zobrist_key(row, col, jewel)
+        self._board[row][col] = jewel
+        self._dirty.add((row, col))
+        self._generation += 1
+        if self._changes is not None:
+            self._changes.add((row, col))
+        if self._array is not None:
+            self._array[row, col] = jewel
+
+    def _sync_array(self) -> None:
+        '''
+        Rebuilds the array copy of the board when the whole board is replaced
+        Every spot on the new board has to be checked for matches again
+        '''
+        self._dirty = {(row, col) for row in range(len(self._board)) for col in range(self._c)}
+        self._shared_rows = set()
+        self._matched_coords = []
+        self._match_groups = []
+        self._generation += 1
+        self._changed_all = True
+        self._hash = 0
+        for row in range(len(self._board)):
+            for col in range(self._c):
+                self._hash ^= _zobrist_key(row, col, self._board[row][col])
+        if self._use_array:
+            self._array = numpy.frombuffer(b''.join(self._board), dtype=numpy.uint8).reshape(len(self._board), self._c).copy()
 
     def get_matched(self) -> list[tuple]:
         return self._matched_coords
     
     def pop(self) -> None:
-        '''Removes the jewels in the coordinaets that were marked in the matching function and replaces with a space'''
+        '''Removes the jewels in the coordinaets that were marked in the matching function and replaces with a space
+        Each round of pops scores more the later it comes in a chain'''
         if self._faller_type == None:
+            if self._matched_coords != []:
+                self._chain += 1
+                if self._match_groups == None:
+                    self._match_groups = self._scan_lines(self._matched_coords)
+                #the groups cover exactly the matched spots, so those are the jewels popped
+                longer = sum(len(spots)-3 for jewel, direction, spots in self._match_groups)
+                self._score += _round_score(len(self._matched_coords), longer, self._chain)
             for location in self._matched_coords:
-                self._board[location[0]][location[1]] = ' '
+                self._set_cell(location[0], location[1], _EMPTY_CODE)
+            if self._popped_spots is not None:
+                self._popped_spots.extend(self._matched_coords)
+            self._popped += len(self._matched_coords)
+            self._matched_coords = []
+            self._match_groups = []
             self._reset_faller
             self.gravity()
     
     def check_for_game_over(self) -> bool:
-        '''Checks if any faller jewels are outside of the user's board (anything past row index 2)
-        Returns False if the game isn't over, True if the game is over'''
-        has_jewel = False
-        # if self._faller_type == 'frozen' or self._faller_type == None:
-        if self.no_matches() == True:
-            for row in range(3):
-                for col in range(len(self._board[row])):
-                    if self._board[row][col] != ' ':
-                        has_jewel = True
-        return has_jewel
+        '''Checks if any faller jewels are outside of the user's board (anything past row index 2) once the board is stable
+        Returns False if the game isn't over, True if the game is over
+        Does not change the board, and is only worked out again once the board or the faller changes'''
+        key = (self._generation, self._faller_type)
+        if self._game_over_key != key:
+            has_jewel = False
+            if self.is_stable() == True:
+                #a stable board has no gaps under any jewel, so only the top of each column needs checking
+                has_jewel = min(self._column_tops) < 3
+            self._game_over_key, self._game_over = key, has_jewel
+        return self._game_over
             
     def _reset_faller(self) -> None:
         '''Does not assign anything to the faller variables until another faller is made'''
@@ -333,3 +705,62 @@ class ColumnsGame():
         self._top_y = None
         self._mid_jewel = None
         self._faller_type = None
+
+
+def score_groups(groups: list[tuple], chain: int) -> int:
+    '''
+    Returns the points for one round of pops, given the groups from get_match_groups and how far into the chain
+    the round is (1 for the first round): 10 for each jewel popped and 10 more for each jewel past three in a group,
+    all multiplied by the chain
+    '''
+    spots = set()
+    longer = 0
+    for jewel, direction, length, group_spots in groups:
+        spots.update(group_spots)
+        longer += length-3
+    return _round_score(len(spots), longer, chain)
+
+def _round_score(popped: int, longer: int, chain: int) -> int:
+    '''Returns the points for popping the given number of jewels with the given number past three in their groups'''
+    return (10*popped + 10*longer) * chain
+
+def _board_lines(r: int, c: int) -> tuple[dict, dict, dict, dict]:
+    '''
+    Returns the spots of every line on the user's board with room for three jewels, in order along the line, for each
+    direction: rows by row, columns by column, downwards diagonals by col-row and upwards diagonals by col+row
+    '''
+    lines = ({}, {}, {}, {})
+    for row in range(3, r+3):
+        for col in range(c):
+            for direction, key in ((0, row), (1, col), (2, col-row), (3, col+row)):
+                lines[direction].setdefault(key, []).append((row, col))
+    return tuple({key: tuple(spots) for key, spots in direction.items() if len(spots) >= 3} for direction in lines)
+
+def _import_numpy() -> None:
+    '''Imports numpy the first time an array board is asked for'''
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+        except ImportError:
+            raise ImportError('numpy is needed to use an array board')
+        numpy = module
+
+def _zobrist_key(row: int, col: int, jewel: int) -> int:
+    '''Returns the random number for a jewel code in a spot; empty spots are 0 so they don't change the hash'''
+    if jewel == _EMPTY_CODE:
+        return 0
+    key = _ZOBRIST_KEYS.get((row, col, jewel))
+    if key == None:
+        #seeded from the spot and the jewel's letter so every process gets the same number
+        key = _ZOBRIST_KEYS[(row, col, jewel)] = random.Random(f'{row}:{col}:{chr(jewel)}').getrandbits(64)
+    return key
+
+def random_faller(rng: random.Random, game: ColumnsGame) -> str:
+    '''Returns the command for a faller of random colors in a random column that still has room, using the given random generator'''
+    column = game.get_open_columns()
+    if column == []:
+        #every column is full, so the faller lands straight away and ends the game
+        column = list(range(game._c))
+    column_num = rng.choice(column)+1
+    return f'F {column_num} {JEWEL_COLORS[rng.randrange(6)]} {JEWEL_COLORS[rng.randrange(6)]} {JEWEL_COLORS[rng.randrange(6)]}'
@@ -0,0 +1,115 @@
+import collections
+import csv
+import json
+import time
+
+#the methods of columns_mechanics.ColumnsGame that are timed, and the name of the stage each one is
+ENGINE_STAGES = {'faller_down': 'faller step', 'matching': 'match scan', 'pop': 'pop',
+                 'gravity': 'gravity', 'check_for_game_over': 'game over check'}
+
+class Profiler():
+    '''
+    Counts and times calls to chosen methods of an object, and groups the results into frames
+    An object is instrumented by switching its class to a made-up subclass with timed versions of the methods,
+    and switching it back when it is uninstrumented, so an object that isn't being profiled runs exactly as it did
+    Times include any timed method called from inside another one (pop includes its gravity)
+    '''
+    def __init__(self, frames_kept: int = 10000):
+        self._subclasses = {}
+        self._instrumented = []
+
+        #calls and nanoseconds for each stage in the frame so far
+        self._counts = collections.Counter()
+        self._times = collections.Counter()
+        self._frame_start = time.perf_counter_ns()
+        #(frame number, nanoseconds the frame took, calls for each stage, nanoseconds for each stage)
+        self._frames = collections.deque(maxlen=frames_kept)
+        self._frame_number = 0
+
+    def instrument(self, obj: object, stages: dict[str, str]) -> None:
+        '''Starts timing the given methods (names mapped to the stage each one counts towards) of the object'''
+        cls = obj.__class__
+        key = (cls, tuple(sorted(stages.items())))
+        subclass = self._subclasses.get(key)
+        if subclass == None:
+            subclass = self._subclasses[key] = self._make_subclass(cls, stages)
+        obj.__class__ = subclass
+        self._instrumented.append((obj, cls))
+
+    def uninstrument(self) -> None:
+        '''Puts back the class of every instrumented object'''
+        for obj, cls in self._instrumented:
+            obj.__class__ = cls
+        self._instrumented = []
+
+    def add(self, stage: str, nanoseconds: int) -> None:
+        '''Counts one call to the stage that took the given time, for stages that aren't a method'''
+        self._counts[stage] += 1
+        self._times[stage] += nanoseconds
+
+    def end_frame(self) -> None:
+        '''Finishes the current frame, keeping what was counted in it, and starts the next one'''
+        now = time.perf_counter_ns()
+        self._frames.append((self._frame_number, now - self._frame_start, dict(self._counts), dict(self._times)))
+        self._frame_number += 1
+        self._frame_start = now
+        self._counts = collections.Counter()
+        self._times = collections.Counter()
+
+    def get_frames(self) -> list[tuple]:
+        '''Returns the frames kept so far, oldest first'''
+        return list(self._frames)
+
+    def summary(self, frames: int = 60) -> list[tuple]:
+        '''
+        Returns (stage, calls in the last frame, milliseconds in the last frame, average milliseconds per frame)
+        over the given number of most recent frames, starting with the whole frame and then each stage by name
+        '''
+        recent = list(self._frames)[-frames:]
+        if recent == []:
+            return []
+        last = recent[-1]
+        stages = sorted({stage for frame in recent for stage in frame[3]})
+        lines = [('frame', 1, last[1]/1e6, sum(frame[1] for frame in recent)/len(recent)/1e6)]
+        for stage in stages:
+            average = sum(frame[3].get(stage, 0) for frame in recent)/len(recent)/1e6
+            lines.append((stage, last[2].get(stage, 0), last[3].get(stage, 0)/1e6, average))
+        return lines
+
+    def dump(self, path: str) -> None:
+        '''Writes every frame kept to a JSON file, or a CSV file (one row per frame and stage) if the path ends in .csv'''
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(('frame', 'frame_ns', 'stage', 'calls', 'ns'))
+                for number, frame_ns, counts, times in self._frames:
+                    for stage in sorted(counts):
+                        writer.writerow((number, frame_ns, stage, counts[stage], times[stage]))
+        else:
+            with open(path, 'w') as file:
+                json.dump([{'frame': number, 'frame_ns': frame_ns, 'calls': counts, 'ns': times}
+                           for number, frame_ns, counts, times in self._frames], file)
+
+    def _make_subclass(self, cls: type, stages: dict[str, str]) -> type:
+        '''
+        Makes a subclass of cls whose given methods are timed
+        It adds no attributes of its own (empty __slots__), so an object can switch between it and cls
+        whether or not cls uses __slots__
+        '''
+        methods = {'__slots__': ()}
+        for name, stage in stages.items():
+            methods[name] = self._timed(getattr(cls, name), stage)
+        return type(f'Profiled{cls.__name__}', (cls,), methods)
+
+    def _timed(self, method, stage: str):
+        '''Returns a version of the method that counts and times each call towards the stage'''
+        profiler = self
+        def timed(obj, *args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return method(obj, *args, **kwargs)
+            finally:
+                profiler.add(stage, time.perf_counter_ns() - start)
+        timed.__name__ = method.__name__
+        timed.__doc__ = method.__doc__
+        return timed
@@ -0,0 +1,193 @@
+import bisect
+import mmap
+import struct
+
+import columns_mechanics
+
+#the file starts with the magic bytes, the version, the board size, how often keyframes are written and the seed
+_MAGIC = b'CRPL'
+_VERSION = 4
+#files from before the keyframe index was added are still read, by scanning them
+_OLD_VERSIONS = (3,)
+_HEADER = struct.Struct('<4sBHHIH')
+
+#every record is one opcode byte, followed by more bytes for fallers and keyframes
+_TICK = 0
+_LEFT = 1
+_RIGHT = 2
+_ROTATE = 3
+_FALLER = 4
+_KEYFRAME = 5
+_INDEX = 6
+
+_FALLER_RECORD = struct.Struct('<H3s')
+_KEYFRAME_RECORD = struct.Struct('<I')
+
+#close ends the file with the index opcode, the tick and state offset of every keyframe, then a trailer with
+#how many keyframes and ticks there are, where the index starts, and magic bytes, so a reader doesn't have to scan
+_INDEX_ENTRY = struct.Struct('<IQ')
+_INDEX_TRAILER = struct.Struct('<IIQ4s')
+_INDEX_MAGIC = b'CIDX'
+
+_MOVES = {'<': _LEFT, '>': _RIGHT, 'R': _ROTATE}
+
+class ReplayWriter():
+    '''
+    Records a game as a compact binary file: one byte for each move and tick, six bytes for each faller,
+    and the whole game state (ColumnsGame.save_state) every keyframe_every ticks so a reader can seek quickly
+    The game is saved as the first keyframe as soon as the writer is made, and close writes an index of the keyframes
+    '''
+    def __init__(self, path: str, game: columns_mechanics.ColumnsGame, seed: str = '', keyframe_every: int = 100):
+        board = game.get_board()
+        #keyframes save the faller's rows as signed 16 bit numbers
+        if len(board) > 0x7fff or len(board[0]) > 0xffff:
+            raise ValueError('board too big to record')
+        self._file = open(path, 'wb')
+        self._keyframe_every = keyframe_every
+        self._ticks = 0
+        #(tick, offset of the state) for every keyframe written, for the index
+        self._keyframes = []
+        seed = str(seed).encode('utf-8')
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION, len(board)-3, len(board[0]), keyframe_every, len(seed)) + seed)
+        self._keyframe(game)
+
+    def record(self, command: str) -> None:
+        '''Records a command in the text protocol: 'F col a b c' makes a faller, '<' and '>' move it and 'R' rotates it'''
+        if command[0] == 'F':
+            command = command.split(' ')
+            self._file.write(bytes((_FALLER,)) + _FALLER_RECORD.pack(int(command[1])-1, ''.join(command[2:5]).encode('ascii')))
+        else:
+            self._file.write(bytes((_MOVES[command],)))
+
+    def tick(self, game: columns_mechanics.ColumnsGame) -> None:
+        '''Records one tick of the game, and a keyframe of the game after it if one is due'''
+        self._file.write(bytes((_TICK,)))
+        self._ticks += 1
+        if self._ticks % self._keyframe_every == 0:
+            self._keyframe(game)
+
+    def close(self) -> None:
+        '''Writes the keyframe index and closes the file'''
+        if self._file.closed:
+            return
+        index = self._file.tell()
+        self._file.write(bytes((_INDEX,)) + b''.join(_INDEX_ENTRY.pack(*keyframe) for keyframe in self._keyframes) +
+                         _INDEX_TRAILER.pack(len(self._keyframes), self._ticks, index, _INDEX_MAGIC))
+        self._file.close()
+
+    def __enter__(self) -> 'ReplayWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _keyframe(self, game: columns_mechanics.ColumnsGame) -> None:
+        '''Writes the whole state of the game after the current number of ticks'''
+        self._keyframes.append((self._ticks, self._file.tell() + 1 + _KEYFRAME_RECORD.size))
+        self._file.write(bytes((_KEYFRAME,)) + _KEYFRAME_RECORD.pack(self._ticks) + game.save_state())
+
+class ReplayReader():
+    '''
+    Reads a file written by ReplayWriter through mmap, so nothing is copied until it is needed
+    Where every keyframe is comes from the index at the end of the file; a file that was never closed
+    (or is from before the index) is scanned once when it is opened instead
+    '''
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.rows, self.cols, self.keyframe_every, seed_length = _HEADER.unpack_from(self._data, 0)
+        if magic != _MAGIC or (version != _VERSION and version not in _OLD_VERSIONS):
+            raise ValueError('not a replay file')
+        self.seed = bytes(self._data[_HEADER.size:_HEADER.size+seed_length]).decode('utf-8')
+        self._start = _HEADER.size + seed_length
+        self._state_size = (self.rows+3)*self.cols + columns_mechanics._STATE_FORMAT.size
+
+        #(tick, offset of the state) for every keyframe, in order, and where the records end
+        self._keyframes = []
+        self.ticks = 0
+        self._end = len(self._data)
+        if self._read_index() == False:
+            for opcode, offset in self._records(self._start):
+                if opcode == _TICK:
+                    self.ticks += 1
+                elif opcode == _KEYFRAME:
+                    self._keyframes.append((_KEYFRAME_RECORD.unpack_from(self._data, offset)[0], offset+_KEYFRAME_RECORD.size))
+
+    def commands(self):
+        '''Yields every recorded command in the text protocol, with '' for each tick'''
+        for opcode, offset in self._records(self._start):
+            if opcode != _KEYFRAME:
+                yield self._command(opcode, offset)
+
+    def seek(self, tick: int) -> columns_mechanics.ColumnsGame:
+        '''Returns the game as it was after the given number of ticks, starting from the last keyframe before it'''
+        if tick < 0 or tick > self.ticks:
+            raise ValueError(f'tick {tick} is not in the replay')
+        current, offset = self._keyframes[bisect.bisect_right(self._keyframes, (tick, len(self._data)))-1]
+
+        game = columns_mechanics.ColumnsGame(self.rows, self.cols)
+        game.create_board('EMPTY')
+        game.load_state(self._data[offset:offset+self._state_size])
+        if current == tick:
+            return game
+        moves = {_LEFT: game.move_faller_left, _RIGHT: game.move_faller_right, _ROTATE: game.rotate_faller}
+        for opcode, record in self._records(offset+self._state_size):
+            if opcode == _TICK:
+                game.tick()
+                current += 1
+                if current == tick:
+                    break
+            elif opcode == _FALLER:
+                col, jewels = _FALLER_RECORD.unpack_from(self._data, record)
+                game.create_faller_at(col, *jewels.decode('ascii'))
+            elif opcode in moves:
+                moves[opcode]()
+        return game
+
+    def close(self) -> None:
+        self._data.close()
+
+    def __enter__(self) -> 'ReplayReader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _read_index(self) -> bool:
+        '''Reads the keyframes and the number of ticks from the index close wrote, returning False if there isn't one'''
+        size = len(self._data)
+        if size < self._start + 1 + _INDEX_TRAILER.size:
+            return False
+        count, ticks, index, magic = _INDEX_TRAILER.unpack_from(self._data, size-_INDEX_TRAILER.size)
+        if magic != _INDEX_MAGIC or index < self._start or self._data[index] != _INDEX \
+        or index + 1 + count*_INDEX_ENTRY.size + _INDEX_TRAILER.size != size:
+            return False
+        self._keyframes = [_INDEX_ENTRY.unpack_from(self._data, index + 1 + i*_INDEX_ENTRY.size) for i in range(count)]
+        self.ticks = ticks
+        self._end = index
+        return True
+
+    def _records(self, offset: int):
+        '''Yields the opcode of every record from the offset on, and where the bytes after the opcode start'''
+        data = self._data
+        end = self._end
+        while offset < end:
+            opcode = data[offset]
+            offset += 1
+            yield opcode, offset
+            if opcode == _FALLER:
+                offset += _FALLER_RECORD.size
+            elif opcode == _KEYFRAME:
+                offset += _KEYFRAME_RECORD.size + self._state_size
+
+    def _command(self, opcode: int, offset: int) -> str:
+        '''Turns one record back into the text protocol'''
+        if opcode == _TICK:
+            return ''
+        if opcode == _FALLER:
+            col, jewels = _FALLER_RECORD.unpack_from(self._data, offset)
+            return f'F {col+1} ' + ' '.join(jewels.decode('ascii'))
+        for command, code in _MOVES.items():
+            if code == opcode:
+                return command
+        raise ValueError(f'unknown record {opcode}')
@@ -0,0 +1,416 @@
+import argparse
+import asyncio
+import sys
+
+import columns_mechanics
+import columns_spectate
+
+#faller status sent in each update
+_STATUS_LETTERS = {None: b'-', 'falling': b'F', 'landed': b'L', 'frozen': b'Z'}
+
+#connections waiting to be accepted, enough for a burst of thousands of clients joining at once
+_BACKLOG = 4096
+
+#a client that sends this much without a newline is cut off
+_MAX_LINE = 1024
+
+#first byte of each command line
+_FALLER = ord('F')
+_LEFT = ord('<')
+_RIGHT = ord('>')
+_ROTATE = ord('R')
+_QUIT = ord('Q')
+#first byte of each spectator command line
+_LIST = ord('L')
+_WATCH = ord('W')
+
+class TimerWheel():
+    '''
+    Ticks every session from one loop: the tick interval is split into slots, each session is put in one slot
+    when it joins, and every slot time the sessions in the next slot are ticked
+    Sessions are spread over the slots in turn so no slot has many more sessions than the others
+    '''
+    def __init__(self, interval: float, slots: int):
+        self._interval = interval
+        self._slots = [dict() for i in range(slots)]
+        self._slot_of = {}
+        self._next_slot = 0
+
+        #how late each slot was ticked compared to when it was due, in seconds
+        self.late_total = 0.0
+        self.late_max = 0.0
+        self.slots_run = 0
+
+    def add(self, session: object) -> None:
+        '''Puts the session in the next slot, so it is ticked once every interval from then on'''
+        slot = self._next_slot
+        self._next_slot = (slot+1) % len(self._slots)
+        self._slots[slot][session] = None
+        self._slot_of[session] = slot
+
+    def remove(self, session: object) -> None:
+        slot = self._slot_of.pop(session, None)
+        if slot != None:
+            del self._slots[slot][session]
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    async def run(self, tick, failed) -> None:
+        '''
+        Calls tick(session) for the sessions of each slot when that slot is due, forever
+        Slot times are counted from when the wheel started, so a late slot doesn't push back the ones after it
+        A session whose tick raises is taken out of the wheel and given to failed(session, exc); the rest carry on
+        '''
+        loop = asyncio.get_running_loop()
+        slot_time = self._interval/len(self._slots)
+        start = loop.time()
+        count = 0
+        while True:
+            due = start + count*slot_time
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                #the wheel is behind, but reading commands and accepting connections still get a turn between slots
+                await asyncio.sleep(0)
+            late = loop.time() - due
+            self.late_total += late
+            self.late_max = max(self.late_max, late)
+            self.slots_run += 1
+            #sessions can leave while the slot is being ticked
+            for session in list(self._slots[count % len(self._slots)]):
+                try:
+                    tick(session)
+                except Exception as exc:
+                    self.remove(session)
+                    failed(session, exc)
+            count += 1
+
+    def reset_stats(self) -> None:
+        self.late_total = 0.0
+        self.late_max = 0.0
+        self.slots_run = 0
+
+class Session(asyncio.Protocol):
+    '''
+    One client playing one game
+    The client sends lines of the text protocol: 'F col a b c' makes a faller, '<' and '>' move it, 'R' rotates it
+    and 'Q' quits; the server ticks the game and sends one update per tick:
+    'B <tick> <status> <popped> <board>' where status is -, F, L or Z and board is the visible rows, row after row
+    Errors are sent as 'ERROR <message>' with the next update, and 'GAME OVER' ends the session
+    '''
+    def __init__(self, server: 'ColumnsServer'):
+        self._server = server
+        self._game = columns_mechanics.ColumnsGame(server.rows, server.cols)
+        self._game.create_board('EMPTY')
+        self._transport = None
+        self._buffer = b''
+        self._ticks = 0
+        #lines waiting to go out with the next update
+        self._pending = []
+        #the client isn't reading fast enough, so updates are skipped until it catches up
+        self._paused = False
+        #number the server knows the game by, and the spectators watching it with the encoder made for them
+        self.number = None
+        self._spectators = {}
+        self._encoder = None
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        self._transport = transport
+        self._server.join(self)
+
+    def connection_lost(self, exc: Exception) -> None:
+        self._server.leave(self)
+
+    def pause_writing(self) -> None:
+        '''Called by asyncio when too much is waiting to be sent; commands stop being read until it drains'''
+        self._paused = True
+        self._transport.pause_reading()
+
+    def resume_writing(self) -> None:
+        self._paused = False
+        self._transport.resume_reading()
+
+    def data_received(self, data: bytes) -> None:
+        '''Applies every complete command line, keeping a cut off line for the next data'''
+        data = self._buffer + data if self._buffer else data
+        start = 0
+        while True:
+            end = data.find(b'\n', start)
+            if end == -1:
+                break
+            line = data[start:end].rstrip(b'\r')
+            start = end+1
+            if line != b'' and self._apply(line) == False:
+                return
+        self._buffer = data[start:]
+        if len(self._buffer) > _MAX_LINE:
+            self._transport.close()
+
+    def tick(self) -> None:
+        '''Ticks the game and sends every line waiting and the new board in one write'''
+        self._game.tick()
+        self._ticks += 1
+        game_over = self._game.check_for_game_over()
+        if self._spectators:
+            self._send_spectators()
+        if self._paused == True and game_over == False:
+            #every update has the whole board, so skipping some loses nothing
+            self._server.skipped += 1
+            return
+        self._pending.append(self._update())
+        if game_over == True:
+            self._pending.append(b'GAME OVER\n')
+        self._transport.write(b''.join(self._pending))
+        self._pending = []
+        self._server.sent += 1
+        if game_over == True:
+            self.close()
+
+    def close(self) -> None:
+        '''Ends the session straight away, closing the connection and any spectators'''
+        self._transport.close()
+        self._server.leave(self)
+
+    def watch(self, spectator: 'Spectator') -> None:
+        '''Sends the spectator the whole game, and every change to it from the next tick on'''
+        if self._encoder == None:
+            self._encoder = columns_spectate.SpectatorEncoder(self._game, self._server.resync_every)
+        self._spectators[spectator] = None
+        spectator.write(self._encoder.resync())
+
+    def unwatch(self, spectator: 'Spectator') -> None:
+        self._spectators.pop(spectator, None)
+        if not self._spectators:
+            self._stop_encoder()
+
+    def close_spectators(self) -> None:
+        for spectator in list(self._spectators):
+            spectator.close()
+        self._spectators = {}
+        self._stop_encoder()
+
+    def _stop_encoder(self) -> None:
+        '''Drops the encoder once nobody watches, so the game stops keeping changes no one will read'''
+        if self._encoder != None:
+            self._encoder = None
+            self._game.stop_deltas()
+
+    def _send_spectators(self) -> None:
+        '''
+        Makes the message for this tick once and writes it to every spectator
+        A spectator that isn't reading fast enough misses deltas, and is sent the whole game once it catches up
+        '''
+        message = self._encoder.update()
+        for spectator in self._spectators:
+            if spectator.paused == True:
+                spectator.behind = True
+            elif spectator.behind == True:
+                spectator.behind = False
+                spectator.write(self._encoder.resync())
+            else:
+                spectator.write(message)
+
+    def _apply(self, line: bytes) -> bool:
+        '''Applies one command line to the game, returning False if the session is over'''
+        command = line[0]
+        try:
+            if command == _FALLER:
+                parts = line.split()
+                col = int(parts[1])-1
+                jewels = [part.decode('ascii') for part in parts[2:5]]
+                if not 0 <= col < self._server.cols:
+                    self._pending.append(b'ERROR no such column\n')
+                elif len(jewels) != 3 or any(jewel not in columns_mechanics.JEWEL_COLORS for jewel in jewels):
+                    self._pending.append(b'ERROR invalid jewel\n')
+                else:
+                    self._game.create_faller_at(col, *jewels)
+            elif command == _LEFT:
+                self._game.move_faller_left()
+            elif command == _RIGHT:
+                self._game.move_faller_right()
+            elif command == _ROTATE:
+                self._game.rotate_faller()
+            elif command == _QUIT:
+                self._transport.close()
+                return False
+            else:
+                self._pending.append(b'ERROR unknown command\n')
+        except (columns_mechanics.InvalidMoveError, ValueError, IndexError, TypeError):
+            self._pending.append(b'ERROR invalid command\n')
+        except columns_mechanics.GameOverError:
+            #the next tick sends the last board and ends the session
+            pass
+        return True
+
+    def _update(self) -> bytes:
+        '''Returns the update line for the game as it is now'''
+        board = self._game.get_board_bytes()[3*self._server.cols:]
+        return b'B %d %s %d %s\n' % (self._ticks, _STATUS_LETTERS[self._game.get_faller_status()], self._game.get_popped(), board)
+
+class Spectator(asyncio.Protocol):
+    '''
+    One client watching games
+    The client sends 'L' to get the numbers of the games being played ('GAMES <number> ...') and 'W <number>' to
+    watch one; from then on it is sent the binary messages of columns_spectate, starting with the whole game, until
+    the game ends and the connection is closed
+    '''
+    def __init__(self, server: 'ColumnsServer'):
+        self._server = server
+        self._transport = None
+        self._buffer = b''
+        self._session = None
+        #the client isn't reading fast enough, and it missed a delta while it wasn't
+        self.paused = False
+        self.behind = False
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        self._transport = transport
+
+    def connection_lost(self, exc: Exception) -> None:
+        if self._session != None:
+            self._session.unwatch(self)
+
+    def pause_writing(self) -> None:
+        self.paused = True
+
+    def resume_writing(self) -> None:
+        self.paused = False
+
+    def write(self, data: bytes) -> None:
+        self._transport.write(data)
+
+    def close(self) -> None:
+        self._session = None
+        self._transport.close()
+
+    def data_received(self, data: bytes) -> None:
+        '''Reads command lines until the client starts watching a game; anything sent after that is ignored'''
+        if self._session != None:
+            return
+        data = self._buffer + data if self._buffer else data
+        start = 0
+        while self._session == None:
+            end = data.find(b'\n', start)
+            if end == -1:
+                break
+            line = data[start:end].rstrip(b'\r')
+            start = end+1
+            if line != b'':
+                self._apply(line)
+        self._buffer = data[start:]
+        if len(self._buffer) > _MAX_LINE:
+            self._transport.close()
+
+    def _apply(self, line: bytes) -> None:
+        '''Applies one spectator command line'''
+        command = line[0]
+        if command == _LIST:
+            self.write(b' '.join([b'GAMES'] + [b'%d' % number for number in self._server.sessions]) + b'\n')
+        elif command == _WATCH:
+            try:
+                session = self._server.sessions.get(int(line.split()[1]))
+            except (ValueError, IndexError):
+                session = None
+            if session == None:
+                self.write(b'ERROR no such game\n')
+            else:
+                self._session = session
+                session.watch(self)
+        else:
+            self.write(b'ERROR unknown command\n')
+
+class ColumnsServer():
+    '''
+    Runs a headless game for every client that connects, all ticked by one timer wheel
+    Spectators connect to a listener of their own and are streamed the changes to one game
+    '''
+    def __init__(self, rows: int = 13, cols: int = 6, interval: float = 1.0, slots: int = 100, resync_every: int = 100):
+        self.rows = rows
+        self.cols = cols
+        self.wheel = TimerWheel(interval, slots)
+        #sessions by the number spectators know them by, and how often spectators are sent the whole game
+        self.sessions = {}
+        self._next_number = 1
+        self.resync_every = resync_every
+
+        #updates sent, and updates skipped because the client was behind
+        self.sent = 0
+        self.skipped = 0
+
+    def join(self, session: Session) -> None:
+        session.number = self._next_number
+        self._next_number += 1
+        self.sessions[session.number] = session
+        self.wheel.add(session)
+
+    def leave(self, session: Session) -> None:
+        self.wheel.remove(session)
+        if self.sessions.pop(session.number, None) != None:
+            session.close_spectators()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 7777, path: str = None, stats: float = 0,
+                    spectate_port: int = None) -> None:
+        '''
+        Listens on a unix socket if a path is given, otherwise on the TCP host and port, until cancelled
+        Spectators are listened for on the TCP host and spectate port if one is given
+        '''
+        loop = asyncio.get_running_loop()
+        if path != None:
+            server = await loop.create_unix_server(lambda: Session(self), path, backlog=_BACKLOG)
+        else:
+            server = await loop.create_server(lambda: Session(self), host, port, backlog=_BACKLOG)
+        spectators = None
+        if spectate_port != None:
+            spectators = await loop.create_server(lambda: Spectator(self), host, spectate_port, backlog=_BACKLOG)
+        tasks = [asyncio.ensure_future(self.wheel.run(Session.tick, self._tick_failed))]
+        if stats > 0:
+            tasks.append(asyncio.ensure_future(self._print_stats(stats)))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if spectators != None:
+                spectators.close()
+
+    def _tick_failed(self, session: Session, exc: Exception) -> None:
+        '''Closes a session whose tick raised, so one broken game doesn't stop the wheel for every other one'''
+        print(f'session {session.number} closed after its tick failed: {exc!r}', file=sys.stderr)
+        session.close()
+
+    async def _print_stats(self, every: float) -> None:
+        '''Prints the number of sessions, updates and how late the ticks were, then starts counting again'''
+        while True:
+            await asyncio.sleep(every)
+            wheel = self.wheel
+            average = wheel.late_total/wheel.slots_run if wheel.slots_run else 0.0
+            print(f'sessions {len(wheel)} sent {self.sent} skipped {self.skipped} '
+                  f'late avg {average*1000:.2f} ms max {wheel.late_max*1000:.2f} ms', file=sys.stderr)
+            wheel.reset_stats()
+            self.sent = 0
+            self.skipped = 0
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Hosts many headless Columns games, one for each client that connects')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--unix', default=None, help='listens on this unix socket path instead of TCP')
+    parser.add_argument('--rows', type=int, default=13)
+    parser.add_argument('--cols', type=int, default=6)
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between the ticks of each game')
+    parser.add_argument('--slots', type=int, default=100, help='slots the tick interval is split into')
+    parser.add_argument('--stats', type=float, default=0, help='prints server stats this often (seconds)')
+    parser.add_argument('--spectate-port', type=int, default=None, help='listens for spectators on this TCP port')
+    parser.add_argument('--resync-every', type=int, default=100, help='ticks between sending spectators the whole game')
+    args = parser.parse_args()
+    server = ColumnsServer(args.rows, args.cols, args.interval, args.slots, args.resync_every)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix, args.stats, args.spectate_port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
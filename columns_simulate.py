@@ -0,0 +1,172 @@
+import os
+import random
+import sys
+
+#argparse, json, concurrent.futures and columns_ai are imported where they are used, so a worker that only
+#plays games with the idle or random policy starts quickly
+import columns_bitboard
+import columns_mechanics
+import columns_replay
+
+def idle_policy(game: columns_mechanics.ColumnsGame, rng: random.Random) -> str:
+    '''Never moves the faller, so it drops straight down where it was made'''
+    return ''
+
+def random_policy(game: columns_mechanics.ColumnsGame, rng: random.Random) -> str:
+    '''Picks a random move (or no move) every step'''
+    return rng.choice(('', '', '<', '>', 'R'))
+
+#the planner stops after this many placements instead of after a time, so a game plays the same in any process
+_PLANNER_NODES = 1000
+
+def make_planner_policy() -> callable:
+    '''
+    Returns a policy that plans the best placement for the faller every step and makes the next move towards it
+    Each game gets its own planner, so nothing one game scored changes the moves of another
+    '''
+    import columns_ai
+    planner = columns_ai.PlacementPlanner(depth=1, time_budget=None, node_budget=_PLANNER_NODES)
+
+    def planner_policy(game: columns_mechanics.ColumnsGame, rng: random.Random) -> str:
+        placement = planner.plan(game)
+        if placement == None:
+            return ''
+        col, rotations = placement
+        if rotations != 0:
+            return 'R'
+        if col > game.get_bot_coords()[1]:
+            return '>'
+        if col < game.get_bot_coords()[1]:
+            return '<'
+        return ''
+    return planner_policy
+
+#policies are looked up by name so they can be sent to other processes; each name gives a function that makes
+#the policy for one game
+POLICIES = {'idle': lambda: idle_policy, 'random': lambda: random_policy, 'planner': make_planner_policy}
+
+#engines are looked up by name for the same reason; both play the same game given the same seed
+ENGINES = {'list': columns_mechanics.ColumnsGame, 'bitboard': columns_bitboard.BitboardColumnsGame}
+
+def simulate_game(seed: str, policy: str = 'random', r: int = 13, c: int = 6, max_ticks: int = 100000,
+                  replay_path: str = None, engine: str = 'list') -> dict:
+    '''
+    Plays one game without a window: a policy picks a move ('<', '>', 'R' or '') every step, then the game ticks
+    The fallers and the policy both use a random generator made from the seed, so the same seed plays the same game
+    If replay_path is given, the game is also recorded there with columns_replay
+    engine picks the game class from ENGINES
+    Returns how long the game lasted, how many jewels were popped, the score, the chains of pops, and why the game ended
+    '''
+    rng = random.Random(seed)
+    choose_move = POLICIES[policy]()
+    game = ENGINES[engine](r, c)
+    game.create_board('EMPTY')
+    recorder = None
+    if replay_path != None:
+        recorder = columns_replay.ReplayWriter(replay_path, game, seed)
+
+    ticks = 0
+    fallers = 0
+    chains = 0
+    longest_chain = 0
+    chain = 0
+    cause = 'max_ticks'
+    while ticks < max_ticks:
+        if game.get_faller_status() == None and game.is_stable() == True:
+            if game.check_for_game_over() == True:
+                cause = 'topped_out'
+                break
+            faller = columns_mechanics.random_faller(rng, game)
+            game.create_faller(faller)
+            fallers += 1
+            if recorder != None:
+                recorder.record(faller)
+
+        move = choose_move(game, rng)
+        try:
+            if move == '<':
+                game.move_faller_left()
+            elif move == '>':
+                game.move_faller_right()
+            elif move == 'R':
+                game.rotate_faller()
+        except columns_mechanics.GameOverError:
+            cause = 'topped_out'
+            break
+        if recorder != None and move != '':
+            recorder.record(move)
+
+        popped = game.get_popped()
+        game.tick()
+        ticks += 1
+        if recorder != None:
+            recorder.tick(game)
+
+        #each round of pops right after another adds to the chain
+        if game.get_popped() != popped:
+            chain += 1
+        elif chain != 0:
+            if chain > 1:
+                chains += 1
+            longest_chain = max(longest_chain, chain)
+            chain = 0
+    if chain > 1:
+        chains += 1
+    longest_chain = max(longest_chain, chain)
+    if recorder != None:
+        recorder.close()
+
+    return {'seed': seed, 'ticks': ticks, 'fallers': fallers, 'popped': game.get_popped(),
+            'score': game.get_score(), 'chains': chains, 'longest_chain': longest_chain, 'cause': cause}
+
+def _simulate_seeded(args: tuple) -> dict:
+    '''Unpacks the arguments for simulate_game so it can be used with map'''
+    return simulate_game(*args)
+
+def run_simulations(games: int, seed: int = 0, policy: str = 'random', r: int = 13, c: int = 6,
+                    max_ticks: int = 100000, processes: int = None, replay_dir: str = None, engine: str = 'list'):
+    '''
+    Plays the given number of games spread across a pool of processes (one per core by default)
+    Game i uses the seed "<seed>:<i>", so any single game can be played again on its own
+    If replay_dir is given, game i is recorded to "<replay_dir>/<seed>_<i>.crpl"
+    Yields the results of each game in order
+    '''
+    jobs = ((f'{seed}:{i}', policy, r, c, max_ticks,
+             None if replay_dir == None else os.path.join(replay_dir, f'{seed}_{i}.crpl'), engine) for i in range(games))
+    if processes == 1:
+        yield from map(_simulate_seeded, jobs)
+        return
+    import concurrent.futures
+    #several chunks per process, so small runs are still spread over every process
+    chunksize = max(1, min(64, games // (4*(processes or os.cpu_count() or 1))))
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        yield from pool.map(_simulate_seeded, jobs, chunksize=chunksize)
+
+def main() -> None:
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description='Plays many Columns games without a window and prints the result of each game as JSON')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='random')
+    parser.add_argument('--rows', type=int, default=13)
+    parser.add_argument('--cols', type=int, default=6)
+    parser.add_argument('--max-ticks', type=int, default=100000)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--replay-dir', default=None, help='records every game to a replay file in this directory')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='list')
+    args = parser.parse_args()
+    if args.replay_dir != None:
+        os.makedirs(args.replay_dir, exist_ok=True)
+
+    totals = {'games': 0, 'ticks': 0, 'popped': 0, 'score': 0, 'chains': 0}
+    for result in run_simulations(args.games, args.seed, args.policy, args.rows, args.cols, args.max_ticks, args.processes,
+                                  args.replay_dir, args.engine):
+        print(json.dumps(result))
+        totals['games'] += 1
+        for key in ('ticks', 'popped', 'score', 'chains'):
+            totals[key] += result[key]
+    print(json.dumps(totals), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import struct
+
+import columns_mechanics
+
+#every message starts with its length (not counting the length itself), its kind, and the generations of the game
+#it goes from and to; a resync goes from 0, since it doesn't need anything before it
+_MESSAGE = struct.Struct('<IBII')
+_LENGTH = struct.Struct('<I')
+_RESYNC = 0
+_DELTA = 1
+
+#a resync has the board size followed by ColumnsGame.save_state
+_SIZE = struct.Struct('<HH')
+#a delta has the number of changed spots, then each spot (its index, row after row) and its jewel, then the number
+#of popped spots and each of their indexes, then the faller, popped count, score and chain as in save_state
+_COUNT = struct.Struct('<H')
+_COUNT_LIMIT = 0xffff
+_CELL = struct.Struct('<HB')
+_SPOT = struct.Struct('<H')
+
+#generations are sent as 32 bit numbers
+_GENERATION_MASK = 0xffffffff
+
+class SpectatorEncoder():
+    '''
+    Turns the deltas of one game into compact binary messages, each made once and sent to every spectator
+    Every resync_every updates the whole state is sent instead of a delta, so a spectator that missed messages
+    (or joined between updates) is never behind for long
+    '''
+    def __init__(self, game: columns_mechanics.ColumnsGame, resync_every: int = 100):
+        board = game.get_board()
+        self._game = game
+        self._rows = len(board) - 3
+        self._cols = len(board[0])
+        if len(board)*len(board[0]) > _COUNT_LIMIT:
+            raise ValueError('board too big to stream')
+        self._resync_every = resync_every
+        self._updates = 0
+        #starts the game's deltas, since the first update only has to hold what changed after this
+        game.take_delta()
+
+    def resync(self) -> bytes:
+        '''Returns a message with the whole state of the game, which is what a new spectator is sent first'''
+        payload = _SIZE.pack(self._rows, self._cols) + self._game.save_state()
+        return _MESSAGE.pack(_MESSAGE.size-_LENGTH.size + len(payload), _RESYNC, 0,
+                             self._game.get_generation() & _GENERATION_MASK) + payload
+
+    def update(self) -> bytes:
+        '''Returns the message for everything that changed since the last update, or a resync if one is due'''
+        before, after, cells, popped, faller = self._game.take_delta()
+        self._updates += 1
+        #a delta can't count more spots than _COUNT holds, and the whole state is never bigger than that
+        if self._updates % self._resync_every == 0 or len(cells) > _COUNT_LIMIT or len(popped) > _COUNT_LIMIT:
+            return self.resync()
+
+        cols = self._cols
+        parts = [_COUNT.pack(len(cells))]
+        parts.extend(_CELL.pack(row*cols + col, ord(jewel)) for row, col, jewel in cells)
+        parts.append(_COUNT.pack(len(popped)))
+        parts.extend(_SPOT.pack(row*cols + col) for row, col in popped)
+        parts.append(_pack_status(self._game, faller))
+        payload = b''.join(parts)
+        return _MESSAGE.pack(_MESSAGE.size-_LENGTH.size + len(payload), _DELTA, before & _GENERATION_MASK,
+                             after & _GENERATION_MASK) + payload
+
+class SpectatorDecoder():
+    '''
+    Rebuilds a game from the messages of a SpectatorEncoder, which can arrive in pieces of any size
+    Deltas are only applied on top of the state they were made from (or one between it and the delta's own
+    generation); anything else is skipped until the next resync
+    '''
+    def __init__(self):
+        self._buffer = b''
+        self._board = None
+        self._status = None
+        self.rows = None
+        self.cols = None
+        self.generation = None
+        #spots popped by the last delta applied
+        self.popped = []
+        self.skipped = 0
+
+    def feed(self, data: bytes) -> int:
+        '''Applies every complete message in the data (and what was left over before it), returning how many were applied'''
+        data = self._buffer + data if self._buffer else data
+        start = 0
+        applied = 0
+        while len(data) - start >= _LENGTH.size:
+            end = start + _LENGTH.size + _LENGTH.unpack_from(data, start)[0]
+            if end > len(data):
+                break
+            if self._apply(data, start, end) == True:
+                applied += 1
+            start = end
+        self._buffer = data[start:]
+        return applied
+
+    def is_synced(self) -> bool:
+        '''Returns True once a resync has been applied'''
+        return self._board != None
+
+    def get_board_bytes(self) -> bytes:
+        '''Returns the board as it is after the last message applied, one jewel letter (or a space) for each spot'''
+        return bytes(self._board)
+
+    def get_game(self) -> columns_mechanics.ColumnsGame:
+        '''Returns a new game in the state the messages so far have put it in'''
+        game = columns_mechanics.ColumnsGame(self.rows, self.cols)
+        game.create_board('EMPTY')
+        game.load_state(bytes(self._board) + self._status)
+        return game
+
+    def _apply(self, data: bytes, start: int, end: int) -> bool:
+        '''Applies the message between start and end, returning False if it was skipped'''
+        length, kind, before, after = _MESSAGE.unpack_from(data, start)
+        offset = start + _MESSAGE.size
+        if kind == _RESYNC:
+            self.rows, self.cols = _SIZE.unpack_from(data, offset)
+            offset += _SIZE.size
+            size = (self.rows+3)*self.cols
+            self._board = bytearray(data[offset:offset+size])
+            self._status = bytes(data[offset+size:end])
+            self.popped = []
+        elif kind == _DELTA:
+            if self._board == None or not (before <= self.generation <= after):
+                self.skipped += 1
+                return False
+            board = self._board
+            count = _COUNT.unpack_from(data, offset)[0]
+            offset += _COUNT.size
+            for i in range(count):
+                index, jewel = _CELL.unpack_from(data, offset)
+                board[index] = jewel
+                offset += _CELL.size
+            count = _COUNT.unpack_from(data, offset)[0]
+            offset += _COUNT.size
+            self.popped = [divmod(_SPOT.unpack_from(data, offset + i*_SPOT.size)[0], self.cols) for i in range(count)]
+            offset += count*_SPOT.size
+            self._status = bytes(data[offset:end])
+        else:
+            raise ValueError(f'unknown message {kind}')
+        self.generation = after
+        return True
+
+def _pack_status(game: columns_mechanics.ColumnsGame, faller: tuple) -> bytes:
+    '''Packs the faller of a delta with the game's popped count, score and chain, the same way save_state does'''
+    if faller == None:
+        col = top = mid = bot = -1
+        jewels, status = b'\0\0\0', None
+    else:
+        status, col, top, jewels = faller
+        mid, bot = top+1, top+2
+        jewels = jewels.encode('ascii')
+    return columns_mechanics._STATE_FORMAT.pack(col, top, mid, bot, jewels, columns_mechanics._STATUS_CODES[status],
+                                                game.get_popped(), game.get_score(), game.get_chain())
@@ -0,0 +1,169 @@
+import argparse
+import curses
+
+import columns_config
+import columns_driver
+
+_FALL_INTERVAL = columns_config.FALL_INTERVAL
+
+#the colors curses has on every terminal, as (red, green, blue), so each jewel can use the one nearest its own color
+_BASIC_COLORS = {curses.COLOR_RED: (255, 0, 0), curses.COLOR_GREEN: (0, 255, 0), curses.COLOR_YELLOW: (255, 255, 0),
+                 curses.COLOR_BLUE: (0, 0, 255), curses.COLOR_MAGENTA: (255, 0, 255), curses.COLOR_CYAN: (0, 255, 255),
+                 curses.COLOR_WHITE: (255, 255, 255)}
+
+#every spot of the board is this many characters wide on the screen
+_SPOT_WIDTH = 2
+
+class TerminalGame():
+    '''
+    Plays Columns in a terminal through curses, with the same keys as the window: the arrows move the faller,
+    space rotates it and P pauses; Q quits
+    What was last written to each cell of the screen is kept, and only cells that look different are written again,
+    so each tick sends very little to the terminal
+    '''
+    def __init__(self, seed: int = None, fall_interval: int = _FALL_INTERVAL, record_path: str = None):
+        #plays the game (falls, new fallers and recording); the terminal only draws it and passes on the user's moves
+        self._driver = columns_driver.GameDriver(seed, fall_interval, record_path)
+        self._game = self._driver.game
+
+        self._screen = None
+        self._running = True
+        self._paused = False
+
+        #what was last written at each (y, x) of the screen as (text, attribute), the spots the faller was drawn in,
+        #and whether everything has to be written again (at the start and when the terminal changes size)
+        self._shadow = {}
+        self._faller_spots = ()
+        self._full_redraw = True
+        #attribute for each jewel letter, set once curses has started
+        self._attributes = {}
+
+    def run(self) -> None:
+        '''Starts curses, plays until the user quits and puts the terminal back as it was'''
+        curses.wrapper(self._run)
+
+    def _run(self, screen) -> None:
+        self._screen = screen
+        curses.curs_set(0)
+        self._set_colors()
+        self._driver.start()
+        try:
+            while self._running:
+                if self._paused == False:
+                    self._driver.fall_when_due()
+                self._redraw()
+                #sleeps until there is a key or the faller is due to fall, whichever comes first
+                if self._paused == True or self._driver.game_over == True:
+                    screen.timeout(-1)
+                else:
+                    screen.timeout(max(0, self._driver.time_to_fall()))
+                self._handle_key(screen.getch())
+        finally:
+            self._driver.close()
+
+    def _set_colors(self) -> None:
+        '''Gives each jewel the basic terminal color nearest the one it has in the window'''
+        self._attributes = {letter: curses.A_BOLD for letter in columns_config.JEWEL_COLORS}
+        if curses.has_colors() == False:
+            return
+        curses.start_color()
+        pair = 1
+        for letter, color in columns_config.JEWEL_COLORS.items():
+            nearest = min(_BASIC_COLORS, key=lambda basic: sum((a-b)**2 for a, b in zip(_BASIC_COLORS[basic], color)))
+            curses.init_pair(pair, nearest, curses.COLOR_BLACK)
+            self._attributes[letter] = curses.color_pair(pair) | curses.A_BOLD
+            pair += 1
+
+    def _handle_key(self, key: int) -> None:
+        '''Moves the faller left or right with the arrows, rotates it with space, and pauses with P or quits with Q'''
+        if key == curses.KEY_RESIZE:
+            self._full_redraw = True
+        elif key in (ord('q'), ord('Q')):
+            self._running = False
+        elif key in (ord('p'), ord('P')) and self._driver.game_over == False:
+            self._paused = not self._paused
+            if self._paused == True:
+                self._driver.pause()
+            else:
+                self._driver.resume()
+        elif self._paused == True or self._driver.game_over == True:
+            return
+        elif key == ord(' '):
+            self._driver.move('R')
+        elif key == curses.KEY_RIGHT:
+            self._driver.move('>')
+        elif key == curses.KEY_LEFT:
+            self._driver.move('<')
+
+    def _redraw(self) -> None:
+        '''
+        Writes the spots that changed since the last frame (the game's delta and the faller's spots) and the status line,
+        skipping any cell that already shows the right thing, then sends it all to the terminal at once
+        When the terminal changes size the screen is cleared and every spot is written again
+        '''
+        before, after, cells, popped, faller = self._game.take_delta()
+        if self._full_redraw == True:
+            self._full_redraw = False
+            self._shadow = {}
+            self._screen.erase()
+            self._draw_border()
+            spots = [(row, col) for row in range(3, columns_config.ROWS+3) for col in range(columns_config.COLUMNS)]
+        else:
+            #the faller's spots look different once it lands or freezes, even if its jewels didn't move
+            spots = {(row, col) for row, col, jewel in cells}.union(self._faller_spots)
+
+        status = self._game.get_faller_status()
+        faller_coords = ()
+        if status != 'frozen' and status != None:
+            faller_coords = (self._game.get_bot_coords(), self._game.get_mid_coords(), self._game.get_top_coords())
+        self._faller_spots = faller_coords
+
+        for row, col in spots:
+            if row < 3:
+                continue
+            jewel = self._game.get_jewel(row, col)
+            if jewel == ' ':
+                look = (' '*_SPOT_WIDTH, curses.A_NORMAL)
+            elif (row, col) in faller_coords:
+                #a faller jewel is drawn differently from a normal jewel, and a landed one differently again
+                look = (jewel.lower() + ('|' if status == 'falling' else ' '), self._attributes[jewel])
+            else:
+                look = (jewel*_SPOT_WIDTH, self._attributes[jewel] | curses.A_REVERSE)
+            self._put(row-2, 1 + col*_SPOT_WIDTH, look)
+
+        text = f'score {self._game.get_score()}  popped {self._game.get_popped()}  chain {self._game.get_chain()}'
+        if self._driver.game_over == True:
+            text += '  GAME OVER'
+        elif self._paused == True:
+            text += '  PAUSED'
+        self._put(columns_config.ROWS+2, 0, (text.ljust(40), curses.A_NORMAL))
+        self._screen.noutrefresh()
+        curses.doupdate()
+
+    def _draw_border(self) -> None:
+        '''Draws the lines around the board'''
+        width = columns_config.COLUMNS*_SPOT_WIDTH
+        self._put(0, 0, ('+' + '-'*width + '+', curses.A_NORMAL))
+        for y in range(1, columns_config.ROWS+1):
+            self._put(y, 0, ('|', curses.A_NORMAL))
+            self._put(y, width+1, ('|', curses.A_NORMAL))
+        self._put(columns_config.ROWS+1, 0, ('+' + '-'*width + '+', curses.A_NORMAL))
+
+    def _put(self, y: int, x: int, look: tuple[str, int]) -> None:
+        '''Writes the text with the attribute at (y, x), unless that is what was last written there'''
+        if self._shadow.get((y, x)) == look:
+            return
+        self._shadow[(y, x)] = look
+        try:
+            self._screen.addstr(y, x, look[0], look[1])
+        except curses.error:
+            #the terminal is too small for this part of the screen
+            pass
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plays Columns in the terminal; the arrows move, space rotates, P pauses and Q quits')
+    parser.add_argument('record', nargs='?', default=None, help='records the game to this replay file')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--interval', type=int, default=_FALL_INTERVAL, help='milliseconds between each step the faller falls')
+    args = parser.parse_args()
+    TerminalGame(seed=args.seed, fall_interval=args.interval, record_path=args.record).run()
@@ -0,0 +1,30 @@
+import random
+
+import columns_mechanics
+
+def _full_scan(game: columns_mechanics.ColumnsGame) -> set:
+    '''Returns the matched spots of a fresh game loaded from the same state, which checks every spot on the board'''
+    fresh = columns_mechanics.ColumnsGame(13, 6)
+    fresh.create_board('EMPTY')
+    fresh.load_state(game.save_state())
+    fresh.matching()
+    return set(fresh.get_matched())
+
+def test_incremental_matching_agrees_with_full_scan():
+    for seed in range(20):
+        rng = random.Random(seed)
+        game = columns_mechanics.ColumnsGame(13, 6)
+        game.create_board('EMPTY')
+        for step in range(400):
+            if game.get_faller_status() == None and game.is_stable() == True:
+                if game.check_for_game_over() == True:
+                    break
+                game.create_faller(columns_mechanics.random_faller(rng, game))
+            try:
+                getattr(game, rng.choice(('move_faller_left', 'move_faller_right', 'rotate_faller', 'get_popped')))()
+            except columns_mechanics.GameOverError:
+                break
+            game.tick()
+            if game.get_faller_status() in (None, 'frozen'):
+                game.matching()
+                assert set(game.get_matched()) == _full_scan(game), (seed, step)
@@ -0,0 +1,51 @@
+import random
+
+import columns_mechanics
+import columns_replay
+
+def _record(path: str, seed: int, steps: int, keyframe_every: int = 10) -> list[bytes]:
+    '''Plays and records a seeded game, returning its state after each tick (starting from before the first)'''
+    rng = random.Random(seed)
+    game = columns_mechanics.ColumnsGame(13, 6)
+    game.create_board('EMPTY')
+    states = [game.save_state()]
+    with columns_replay.ReplayWriter(path, game, seed, keyframe_every) as writer:
+        for step in range(steps):
+            if game.get_faller_status() == None and game.is_stable() == True:
+                if game.check_for_game_over() == True:
+                    break
+                faller = columns_mechanics.random_faller(rng, game)
+                game.create_faller(faller)
+                writer.record(faller)
+            move = rng.choice(('', '<', '>', 'R'))
+            try:
+                if move != '':
+                    {'<': game.move_faller_left, '>': game.move_faller_right, 'R': game.rotate_faller}[move]()
+                    writer.record(move)
+            except columns_mechanics.GameOverError:
+                break
+            game.tick()
+            writer.tick(game)
+            states.append(game.save_state())
+    return states
+
+def test_seek_matches_live_game(tmp_path):
+    path = str(tmp_path / 'game.crpl')
+    states = _record(path, 4, 500)
+    with columns_replay.ReplayReader(path) as reader:
+        assert reader.ticks == len(states)-1
+        for tick in (0, 1, 9, 10, 11, 57, len(states)-1):
+            assert reader.seek(tick).save_state() == states[tick]
+
+def test_seek_without_index(tmp_path):
+    path = str(tmp_path / 'game.crpl')
+    states = _record(path, 5, 200)
+    with columns_replay.ReplayReader(path) as reader:
+        end = reader._end
+    #a file that was never closed has no index, so the reader has to scan it
+    with open(path, 'r+b') as file:
+        file.truncate(end)
+    with columns_replay.ReplayReader(path) as reader:
+        assert reader.ticks == len(states)-1
+        for tick in range(0, len(states), 13):
+            assert reader.seek(tick).save_state() == states[tick]
@@ -0,0 +1,65 @@
+import random
+
+import columns_mechanics
+import columns_spectate
+
+def _play(seed: int, steps: int):
+    '''Yields a seeded game after each of its ticks'''
+    rng = random.Random(seed)
+    game = columns_mechanics.ColumnsGame(13, 6)
+    game.create_board('EMPTY')
+    yield game
+    for step in range(steps):
+        if game.get_faller_status() == None and game.is_stable() == True:
+            if game.check_for_game_over() == True:
+                return
+            game.create_faller(columns_mechanics.random_faller(rng, game))
+        try:
+            getattr(game, rng.choice(('move_faller_left', 'move_faller_right', 'rotate_faller', 'get_popped')))()
+        except columns_mechanics.GameOverError:
+            return
+        game.tick()
+        yield game
+
+def _view(game: columns_mechanics.ColumnsGame) -> tuple:
+    '''Returns what a spectator sees; where a faller that is gone used to be isn't sent, so it isn't compared'''
+    status = game.get_faller_status()
+    faller = None if status == None else (game.get_top_coords(), game.get_mid_coords(), game.get_bot_coords())
+    return game.get_board_bytes(), status, faller, game.get_popped(), game.get_score(), game.get_chain()
+
+def test_round_trip_with_resyncs():
+    popped = 0
+    for seed in range(6):
+        games = _play(seed, 300)
+        game = next(games)
+        encoder = columns_spectate.SpectatorEncoder(game, resync_every=7)
+        decoder = columns_spectate.SpectatorDecoder()
+        decoder.feed(encoder.resync())
+        rng = random.Random(seed)
+        for game in games:
+            message = encoder.update()
+            #messages can arrive in pieces of any size
+            cut = rng.randrange(len(message)+1)
+            assert decoder.feed(message[:cut]) + decoder.feed(message[cut:]) == 1
+            assert decoder.get_board_bytes() == game.get_board_bytes()
+            assert _view(decoder.get_game()) == _view(game)
+        assert decoder.skipped == 0
+        popped += game.get_popped()
+    #the deltas have to carry some pops for the test to mean anything
+    assert popped > 0
+
+def test_late_spectator_waits_for_resync():
+    games = _play(3, 50)
+    game = next(games)
+    encoder = columns_spectate.SpectatorEncoder(game, resync_every=5)
+    decoder = columns_spectate.SpectatorDecoder()
+    synced = False
+    for game in games:
+        applied = decoder.feed(encoder.update())
+        if decoder.is_synced() == False:
+            assert applied == 0
+            assert decoder.skipped > 0
+        else:
+            synced = True
+            assert _view(decoder.get_game()) == _view(game)
+    assert synced == True